@@ -1,8 +1,7 @@
 import numpy as np
-from proply.foil_simulator import XfoilSimulatedFoil as FoilSimulator
+from proply.foil_simulator import TieredSimulatedFoil as FoilSimulator
 
 # from foil_simulator import PlateSimulatedFoil as FoilSimulator
-import math
 from proply import optimize
 
 import logging
@@ -21,6 +20,43 @@ logger = logging.getLogger(__name__)
 """
 
 
+def section_grid(shapes, twist, r, scimitar_offset):
+    """Place sections on the blade, all stations at once.
+
+    shapes is (stations, 2, 2, n): the lower and upper surface x, y of each
+    section at zero angle of attack (Foil.get_shape_points). twist, r and
+    scimitar_offset are scalars or one per station.
+
+    Each section is rotated by its twist about 0.67 of its chord and
+    wrapped onto the cylinder of radius r, points in the y - z plane
+    going round the circumference. Returns (stations, 2, n, 3) points.
+    """
+    shapes = np.asarray(shapes, dtype=float)
+    stations = len(shapes)
+    twist, r, scimitar_offset = [
+        np.broadcast_to(np.asarray(a, dtype=float), (stations,))[:, None, None]
+        for a in (twist, r, scimitar_offset)
+    ]
+    x = shapes[:, :, 0, :]
+    y = shapes[:, :, 1, :]
+
+    xu = x[:, 1]
+    x0 = 0.67 * (np.max(xu, axis=1) - np.min(xu, axis=1))[:, None, None]
+    c = np.cos(twist)
+    s = np.sin(twist)
+    along = (x - x0) * c + y * s
+    z = -(x - x0) * s + y * c
+
+    # Transform the profile to lie on a circle of radius r
+    theta = along / r + np.arctan(scimitar_offset / r)
+
+    grid = np.empty(x.shape + (3,))
+    grid[..., 0] = r * np.cos(theta)
+    grid[..., 1] = r * np.sin(theta)
+    grid[..., 2] = z
+    return grid
+
+
 class BladeElement:
     def __init__(self, r, dr, foil, twist, rpm, u_0):
         self.r = r
@@ -37,9 +73,10 @@ class BladeElement:
         self.u_0 = u_0
 
     def get_zero_cl_angle(self):
-        return 0.0
-        # self.zero_lift_angle = self.fs.get_zero_cl_angle(self.velocity)
-        # return self.zero_lift_angle
+        if not optimize.polar_bounds:
+            return 0.0
+        self.zero_lift_angle = self.fs.get_zero_cl_angle(self.velocity)
+        return self.zero_lift_angle
 
     def set_chord(self, c):
         self.foil.modify_chord(c)
@@ -90,46 +127,9 @@ class BladeElement:
         self.velocity = np.sqrt(u ** 2 + v ** 2)
 
     def get_foil_points(self, n, scimitar_offset):
-        pl, pu = self.foil.get_points(n, self._twist)
-        r = self.r
-
-        """ points are in the y - z plane. The x value is set by the radius"""
-        yl, zl = pl
-        yu, zu = pu
-        x = np.zeros(n) + r
-
-        # y_offset = np.mean(np.append(yl,yu))
-
-        # yl -= y_offset
-        # yu -= y_offset
-
-        scimitar_angle = math.atan(scimitar_offset / r)
-
-        # Transform the profile to lie on a circle of radius r
-        c = 2.0 * np.pi * r  # Circumference
-        theta_l = (
-            2.0 * np.pi * yl / c + scimitar_angle
-        )  # angular coordinate along circumference (fraction)
-        xl = r * np.cos(theta_l)
-        yl = r * np.sin(theta_l)
-
-        theta_u = (
-            2.0 * np.pi * yu / c + scimitar_angle
-        )  # angular coordinate along circumference (fraction)
-        xu = r * np.cos(theta_u)
-        yu = r * np.sin(theta_u)
-
-        upper_line = np.zeros([n, 3])
-        upper_line[:, 0] = xu
-        upper_line[:, 1] = yu
-        upper_line[:, 2] = zu
-
-        lower_line = np.zeros([n, 3])
-        lower_line[:, 0] = xl
-        lower_line[:, 1] = yl
-        lower_line[:, 2] = zl
-
-        return lower_line, upper_line
+        shape = np.array([self.foil.get_shape_points(n)])
+        grid = section_grid(shape, self._twist, self.r, scimitar_offset)
+        return grid[0, 0], grid[0, 1]
 
     def __repr__(self):
         dt = self.dT()
@@ -6,19 +6,24 @@
     Copyright 2016-2017
 
 """
-import numpy as np
+import hashlib
 
-try:
-    import importlib.resources as pkg_resources
-except ImportError:
-    # Try backported to PY<37 `importlib_resources`.
-    import importlib_resources as pkg_resources
+import numpy as np
+from collections import OrderedDict
+from scipy.spatial import ConvexHull, QhullError
+from scipy.special import comb, beta
 
 import logging
 
 logger = logging.getLogger(__name__)
 
-from proply import foils
+from proply.foil_registry import foil_registry
+
+# Unit chord section shapes, shared by every Foil instance. Keyed by
+# Foil.shape_key, least recently used shapes dropped beyond the size.
+g_shape_cache = OrderedDict()
+g_shape_cache_size = 4096
+g_hull_cache = OrderedDict()
 
 
 class Foil(object):
@@ -67,53 +72,42 @@ class Foil(object):
     def set_trailing_edge(self, te):
         self.trailing_edge = te / self.chord
 
+    def shape_key(self, n):
+        """ Everything the unit chord shape depends on """
+        return (type(self).__name__, self.thickness, self.trailing_edge, n)
+
     def get_shape_points(self, n):
-        """Return a list of x,y coordinates for the foil with zero angle of attack"""
-        x = np.linspace(0, self.chord, n)
-        y = self.thickness * self.chord * np.ones(n)
-        return [[x, -y], [x, y]]
+        """Return a list of x,y coordinates for the foil with zero angle of attack
+
+        The unit chord shape is computed once per shape_key and scaled to
+        the current chord, so modify_chord does not regenerate it.
+        """
+        key = self.shape_key(n)
+        shape = g_shape_cache.get(key)
+        if shape is None:
+            shape = [np.array(a, dtype=float) for a in self.unit_shape_points(n)]
+            for a in shape:
+                a.setflags(write=False)
+            g_shape_cache[key] = shape
+            if len(g_shape_cache) > g_shape_cache_size:
+                g_shape_cache.popitem(last=False)
+        else:
+            g_shape_cache.move_to_end(key)
+
+        xl, yl, xu, yu = shape
+        c = self.chord
+        return [[xl * c, yl * c], [xu * c, yu * c]]
+
+    def unit_shape_points(self, n):
+        """x,y coordinates (xl, yl, xu, yu) of the foil with unit chord"""
+        x = np.linspace(0, 1.0, n)
+        y = self.thickness * np.ones(n)
+        return x, -y, x, y
 
     @staticmethod
     def load_selig(filename):
-        """ Load points from a file and normalize """
-        # fd = open(filename, 'r')
-        fd = pkg_resources.open_text(foils, filename)
-
-        seligFile = fd.read()
-        fd.close()
-
-        # all SQL commands (split on ';')
-        points = seligFile.split("\n")
-
-        # Execute every command from the input file
-        xu = []
-        yu = []
-        xl = []
-        yl = []
-        x_prev = 9e99
-        import re
-
-        expr = re.compile(r"[0-9.-]+")
-        for p in points:
-            try:
-                pts = re.findall(expr, p)
-                x0 = float(pts[0])
-                y0 = float(pts[1])
-                if x0 < x_prev:
-                    xu.append(x0)
-                    yu.append(y0)
-                else:
-                    xl.append(x0)
-                    yl.append(y0)
-                x_prev = x0
-
-            except:
-                logger.info("No information on line {}".format(p))
-        # xl.reverse()
-        # yl.reverse()
-        xu.reverse()
-        yu.reverse()
-        return np.array(xl), np.array(yl), np.array(xu), np.array(yu)
+        """ Load points from a packaged (or on disk) coordinate file """
+        return foil_registry.get(filename)
 
     def get_points(self, n, rotation_angle):
         pl, pu = self.get_shape_points(n)
@@ -128,36 +122,63 @@ class Foil(object):
 
         return [[xl, yl], [xu, yu]]
 
+    def unit_hull(self, n=50):
+        """Convex hull vertices (k, 2) of the unit chord section, placed as in
+        get_points (shifted by x0 but not rotated). Cached with the shape.
+        """
+        key = self.shape_key(n)
+        hull = g_hull_cache.get(key)
+        if hull is None:
+            pl, pu = self.get_points(n, 0.0)
+            pts = np.transpose(np.concatenate([pl, pu], axis=1)) / self.chord
+            try:
+                hull = pts[ConvexHull(pts).vertices]
+            except QhullError:
+                hull = pts  # Degenerate (flat) section
+            g_hull_cache[key] = hull
+            if len(g_hull_cache) > g_shape_cache_size:
+                g_hull_cache.popitem(last=False)
+        else:
+            g_hull_cache.move_to_end(key)
+        return hull
+
     """ Return the lowest and highest point in the foil """
 
     def get_bounding_box(self, theta):
-        pl, pu = self.get_points(50, theta)
-        xu, yu = pu
-        xl, yl = pl
+        """Extent of the foil rotated by theta: x_min, x_max, y_min, y_max.
 
-        x = np.concatenate([xl, xu])
-        y = np.concatenate([yl, yu])
-
-        return np.min(x), np.max(x), np.min(y), np.max(y)
+        The rotated extent is the support function of the section, so only
+        the convex hull vertices are projected. theta may be an array, in
+        which case each extent is an array over theta.
+        """
+        hull = self.unit_hull() * self.chord
+        theta = np.asarray(theta, dtype=float)
+        c = np.cos(theta)[..., None]
+        s = np.sin(theta)[..., None]
+        x = hull[:, 0] * c + hull[:, 1] * s
+        y = -hull[:, 0] * s + hull[:, 1] * c
+
+        return (
+            np.min(x, axis=-1),
+            np.max(x, axis=-1),
+            np.min(y, axis=-1),
+            np.max(y, axis=-1),
+        )
 
     def get_max_chord(self, x_limit, y_limit, theta):
-        """ Find the largest chord that could fit the foil into a box"""
+        """ Find the largest chord that could fit the foil into a box.
+            theta may be an array of twist angles.
+        """
         x0, x1, y0, y1 = self.get_bounding_box(theta)
-        print(("get_bounding_box({},{},{},{},".format(x0, x1, y0, y1)))
         dy = y1 - y0
         dx = x1 - x0
-
-        print(
-            (
-                "get_max_chord({},{},{}) dx={}, dy={}".format(
-                    x_limit, y_limit, theta, dx, dy
-                )
-            )
+        logger.debug(
+            "get_max_chord({},{},{}) dx={}, dy={}".format(x_limit, y_limit, theta, dx, dy)
         )
         y_scale = y_limit / dy
         x_scale = x_limit / dx
 
-        return self.chord * min(x_scale, y_scale)
+        return self.chord * np.minimum(x_scale, y_scale)
 
     def rotate(self, x, y, theta):
         """ Rotate the points to the angle of attack around"""
@@ -219,22 +240,38 @@ class NACA4(Foil):
             (self.thickness * 100),
         )
 
-    def get_shape_points(self, n):
-        """Return a list of x,y coordinates for the foil
-        NACA report 460
+    def shape_key(self, n):
+        return ("NACA4", self.thickness, self.m, self.p, self.trailing_edge, n)
 
-        The zero in the x axis is shifted to the center of pressure (chord / 4)
+    def unit_shape_points(self, n):
+        """Return the x,y coordinates for the foil with unit chord
+        NACA report 460
         """
+        lower, upper = NACA4.batch_shape_points(
+            1.0, self.thickness, self.m, self.p, self.trailing_edge, n
+        )
+        return lower[0, :, 0], lower[0, :, 1], upper[0, :, 0], upper[0, :, 1]
 
-        t = self.thickness
-        p = self.p
-        m = self.m
+    @staticmethod
+    def batch_shape_points(chord, thickness, m, p, trailing_edge, n):
+        """Shape points for many NACA 4 sections in one pass.
 
-        n = n * 5
-        beta = np.linspace(0, np.pi, n)  # Use cosine spacing of points.
-        x = (1.0 - np.cos(beta)) / 2
+        Parameters are scalars or arrays with one entry per station
+        (trailing_edge is relative to the chord, as in set_trailing_edge).
+        Returns the lower and upper surfaces as (stations, n, 2) arrays of
+        x, y from the leading edge to the trailing edge.
 
-        y_offset = np.linspace(0, self.trailing_edge / 2, n)
+        The points are those of the cosine spacing with 5n points, every
+        fifth one taken, but only the n points kept are computed.
+        """
+        chord, t, m, p, te = [
+            np.atleast_1d(np.asarray(a, dtype=float))[:, None]
+            for a in np.broadcast_arrays(chord, thickness, m, p, trailing_edge)
+        ]
+
+        frac = 5.0 * np.arange(n) / (5.0 * n - 1.0)
+        beta = np.pi * frac  # Use cosine spacing of points.
+        x = (1.0 - np.cos(beta)) / 2
 
         yt = (
             5.0
@@ -246,42 +283,228 @@ class NACA4(Foil):
                 + 0.2843 * (x ** 3)
                 + -0.1036 * (x ** 4)
             )
-            + y_offset
+            + frac * te / 2
         )
 
-        yc = (m / (p ** 2)) * (2.0 * p * x - x ** 2)
-        yc2 = (m / ((1.0 - p) ** 2)) * (1.0 - 2.0 * p + 2 * p * x - x ** 2)
-        yc[x > p] = yc2[x > p]
-
-        dyc = m * (2.0 * p - 2 * x) / p ** 2
-        dyc[x > p] = (2 * m * (p - x) / (p - 1.0) ** 2)[x > p]
+        front = x <= p
+        with np.errstate(divide="ignore", invalid="ignore"):
+            yc = np.where(
+                front,
+                (m / (p ** 2)) * (2.0 * p * x - x ** 2),
+                (m / ((1.0 - p) ** 2)) * (1.0 - 2.0 * p + 2 * p * x - x ** 2),
+            )
+            dyc = np.where(
+                front,
+                m * (2.0 * p - 2 * x) / p ** 2,
+                2 * m * (p - x) / (p - 1.0) ** 2,
+            )
+        # Symmetric sections have no camber line (and may have p = 0)
+        flat = np.broadcast_to(m == 0, yc.shape)
+        yc[flat] = 0.0
+        dyc[flat] = 0.0
 
         theta = np.arctan(dyc)
+        sin_t = np.sin(theta)
+        cos_t = np.cos(theta)
 
-        xu = x - yt * np.sin(theta)
-        yu = yc + yt * np.cos(theta)
+        lower = np.empty((len(chord), n, 2))
+        upper = np.empty((len(chord), n, 2))
+        upper[:, :, 0] = (x - yt * sin_t) * chord
+        upper[:, :, 1] = (yc + yt * cos_t) * chord
+        lower[:, :, 0] = (x + yt * sin_t) * chord
+        lower[:, :, 1] = (yc - yt * cos_t) * chord
+        return lower, upper
 
-        xl = x + yt * np.sin(theta)
-        yl = yc - yt * np.cos(theta)
 
-        if False:
-            # Translate to a system where 0,0 is the max_x, max_y (these are defined by p and t)
-            # max(yt) = 0.5, occurs at x=.2998
-            # max(dyc) = p
-            max_x = xu[np.argmax(yu)]  # 0.3
-            if max_x > 0.5:
-                max_x = 0.5
-            max_y = np.max(yu)
-            # print np.max(yu), max_y, np.argmax(yu)
+def section_shapes(foils, n):
+    """The shape points of many foils, (stations, 2, 2, n), as
+    np.array([f.get_shape_points(n) for f in foils]).
 
-            xu = xu - max_x
-            xl = xl - max_x
+    When every foil is a NACA4 section they are all generated in one
+    NumPy pass by NACA4.batch_shape_points.
+    """
+    if len(foils) > 0 and all(type(f) is NACA4 for f in foils):
+        lower, upper = NACA4.batch_shape_points(
+            [f.chord for f in foils],
+            [f.thickness for f in foils],
+            [f.m for f in foils],
+            [f.p for f in foils],
+            [f.trailing_edge for f in foils],
+            n,
+        )
+        return np.stack([lower, upper], axis=1).transpose(0, 1, 3, 2)
+    return np.array([f.get_shape_points(n) for f in foils])
 
-            yu = yu - max_y
-            yl = yl - max_y
 
-        c = self.chord
-        return [[xl[::5] * c, yl[::5] * c], [xu[::5] * c, yu[::5] * c]]
+class CSTFoil(Foil):
+    """
+    Foil from the class-shape transformation (Kulfan, 2008)
+
+        y = x^n1 (1 - x)^n2 sum_i A_i B_i(x) +/- x te / 2
+
+    with B_i the Bernstein polynomials of order len(A) - 1 and one set of
+    coefficients A for each surface. n1 = 0.5, n2 = 1 is a round nosed
+    foil with a sharp trailing edge.
+    """
+
+    # Least squares fit to the NACA 0012 upper surface
+    default_coefficients = np.array([0.1717, 0.1536, 0.1617, 0.1354, 0.1461, 0.1435])
+
+    def __init__(self, chord, thickness=None, au=None, al=None, n1=0.5, n2=1.0):
+        """
+        Parameters:
+          au, al - upper and lower surface coefficients (the lower ones
+                   are negative for a positive lower surface thickness).
+                   A NACA 0012 fit by default.
+          thickness - if given, the thickness distribution (au - al) / 2
+                      is scaled to this maximum thickness, keeping the camber.
+        """
+        if au is None:
+            au = CSTFoil.default_coefficients
+        if al is None:
+            al = -np.asarray(au)
+        au = np.array(au, dtype=float)
+        al = np.array(al, dtype=float)
+        self.n1 = n1
+        self.n2 = n2
+        if thickness is not None:
+            t = CSTFoil.metrics(au, al, n1, n2)["thickness"][0]
+            at = (au - al) / 2 * (thickness / t)
+            ac = (au + al) / 2
+            au = ac + at
+            al = ac - at
+        self.au = au
+        self.al = al
+        Foil.__init__(self, chord, CSTFoil.metrics(au, al, n1, n2)["thickness"][0])
+
+    def hash(self):
+        """ Generate a unique hash for this foil, from its full precision parameters"""
+        h = hashlib.sha1()
+        for a in (self.au, self.al, [self.n1, self.n2, self.trailing_edge]):
+            h.update(np.round(np.asarray(a, dtype=float), 10).tobytes())
+        return "CST " + h.hexdigest()
+
+    def __repr__(self):
+        m = CSTFoil.metrics(self.au, self.al, self.n1, self.n2)
+        return "ch=%f, te=%4.3f, CST%d t=%4.2f%% c=%4.2f%%" % (
+            self.chord,
+            self.trailing_edge,
+            len(self.au) - 1,
+            m["thickness"][0] * 100,
+            m["camber"][0] * 100,
+        )
+
+    def shape_key(self, n):
+        return (
+            "CST",
+            tuple(self.au),
+            tuple(self.al),
+            self.n1,
+            self.n2,
+            self.trailing_edge,
+            n,
+        )
+
+    def unit_shape_points(self, n):
+        lower, upper = CSTFoil.batch_shape_points(
+            1.0, self.au, self.al, self.trailing_edge, n, self.n1, self.n2
+        )
+        return lower[0, :, 0], lower[0, :, 1], upper[0, :, 0], upper[0, :, 1]
+
+    @staticmethod
+    def shape_functions(x, order, n1=0.5, n2=1.0):
+        """ Class function times each Bernstein polynomial, (len(x), order + 1) """
+        x = np.asarray(x, dtype=float)[:, None]
+        i = np.arange(order + 1)
+        return x ** n1 * (1.0 - x) ** n2 * comb(order, i) * x ** i * (1.0 - x) ** (order - i)
+
+    @staticmethod
+    def batch_shape_points(chord, au, al, trailing_edge, n, n1=0.5, n2=1.0):
+        """Shape points for many coefficient sets in one pass.
+
+        au, al are (sets, order + 1) arrays (or one set). chord and
+        trailing_edge are scalars or one per set. Returns the lower and
+        upper surfaces as (sets, n, 2) arrays as NACA4.batch_shape_points.
+        """
+        au = np.atleast_2d(au)
+        al = np.atleast_2d(al)
+        chord = np.broadcast_to(chord, len(au))[:, None]
+        te = np.broadcast_to(trailing_edge, len(au))[:, None]
+
+        frac = 5.0 * np.arange(n) / (5.0 * n - 1.0)
+        x = (1.0 - np.cos(np.pi * frac)) / 2  # Use cosine spacing of points.
+        S = CSTFoil.shape_functions(x, au.shape[1] - 1, n1, n2)
+
+        lower = np.empty((len(au), n, 2))
+        upper = np.empty((len(au), n, 2))
+        upper[:, :, 0] = x * chord
+        upper[:, :, 1] = (au @ S.T + x * te / 2) * chord
+        lower[:, :, 0] = x * chord
+        lower[:, :, 1] = (al @ S.T - x * te / 2) * chord
+        return lower, upper
+
+    @staticmethod
+    def metrics(au, al, n1=0.5, n2=1.0, n=101):
+        """Thickness and camber metrics (unit chord) of coefficient sets.
+
+        Returns a dict of arrays, one entry per set: thickness and camber
+        (maximum, with their x positions), area of the section, and the
+        leading edge radius (for n1 = 0.5). Only the area is closed form.
+        The maxima are estimated numerically from the shape sampled at n
+        cosine spaced points, refined by fitting a parabola through the
+        best point and its neighbours.
+        """
+        au = np.atleast_2d(au)
+        al = np.atleast_2d(al)
+        order = au.shape[1] - 1
+        x = (1.0 - np.cos(np.linspace(0, np.pi, n))) / 2
+        S = CSTFoil.shape_functions(x, order, n1, n2)
+
+        def peak(y):
+            k = np.clip(np.argmax(y, axis=1), 1, n - 2)
+            rows = np.arange(len(y))
+            x0, x1, x2 = x[k - 1], x[k], x[k + 1]
+            y0, y1, y2 = y[rows, k - 1], y[rows, k], y[rows, k + 1]
+            # Vertex of the parabola through the three points
+            d0 = (y1 - y0) / (x1 - x0)
+            d1 = (y2 - y1) / (x2 - x1)
+            a = (d1 - d0) / (x2 - x0)
+            with np.errstate(divide="ignore", invalid="ignore"):
+                xm = np.where(a < 0, (x0 + x1) / 2 - d0 / (2 * a), x1)
+            xm = np.clip(xm, x0, x2)
+            ym = y1 + (xm - x1) * (d0 + a * (xm - x0))
+            return np.maximum(ym, np.max(y, axis=1)), xm
+
+        thickness, thickness_x = peak((au - al) @ S.T)
+        camber_line = (au + al) / 2 @ S.T
+        sign = np.where(
+            np.max(camber_line, axis=1) >= -np.min(camber_line, axis=1), 1.0, -1.0
+        )
+        camber, camber_x = peak(sign[:, None] * camber_line)
+
+        # Integral of x^(n1 + i) (1 - x)^(n2 + order - i) is a beta function
+        i = np.arange(order + 1)
+        moments = comb(order, i) * beta(n1 + i + 1, n2 + order - i + 1)
+
+        return {
+            "thickness": thickness,
+            "thickness_x": thickness_x,
+            "camber": sign * camber,
+            "camber_x": camber_x,
+            "area": (au - al) @ moments,
+            "le_radius": np.minimum(au[:, 0], -al[:, 0]) ** 2 / 2,
+        }
+
+    @staticmethod
+    def fit_coefficients(xl, yl, xu, yu, order=5, n1=0.5, n2=1.0):
+        """ Least squares au, al for unit chord surface coordinates """
+        au = np.linalg.lstsq(
+            CSTFoil.shape_functions(xu, order, n1, n2), yu - xu * yu[-1], rcond=None
+        )[0]
+        al = np.linalg.lstsq(
+            CSTFoil.shape_functions(xl, order, n1, n2), yl - xl * yl[-1], rcond=None
+        )[0]
+        return au, al
 
 
 if __name__ == "__main__":
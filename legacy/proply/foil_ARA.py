@@ -1,8 +1,20 @@
 import numpy as np
+from collections import OrderedDict
 
 from proply.foil import Foil
+from proply import foils
 from scipy.interpolate import PchipInterpolator
 
+try:
+    import importlib.resources as pkg_resources
+except ImportError:
+    # Try backported to PY<37 `importlib_resources`.
+    import importlib_resources as pkg_resources
+
+import logging
+
+logger = logging.getLogger(__name__)
+
 
 class ARAD_6_Foil(Foil):
     """ARA-D 20% AIRFOIL"""
@@ -21,11 +33,9 @@ class ARAD_6_Foil(Foil):
             (self.thickness * 100),
         )
 
-    def get_shape_points(self, n):
+    def unit_shape_points(self, n):
         xu, yu, xl, yl = self.load_selig("ara_d_6.dat")
-        c = self.chord
-
-        return [[xl * c, yl * c], [xu * c, yu * c]]
+        return xl, yl, xu, yu
 
 
 class ARAD_10_Foil(Foil):
@@ -45,11 +55,9 @@ class ARAD_10_Foil(Foil):
             (self.thickness * 100),
         )
 
-    def get_shape_points(self, n):
+    def unit_shape_points(self, n):
         xu, yu, xl, yl = self.load_selig("ara_d_10.dat")
-        c = self.chord
-
-        return [[xl * c, yl * c], [xu * c, yu * c]]
+        return xl, yl, xu, yu
 
 
 class ARAD_13_Foil(Foil):
@@ -69,11 +77,9 @@ class ARAD_13_Foil(Foil):
             (self.thickness * 100),
         )
 
-    def get_shape_points(self, n):
+    def unit_shape_points(self, n):
         xu, yu, xl, yl = self.load_selig("ara_d_13.dat")
-        c = self.chord
-
-        return [[xl * c, yl * c], [xu * c, yu * c]]
+        return xl, yl, xu, yu
 
 
 class ARAD_20_Foil(Foil):
@@ -93,34 +99,77 @@ class ARAD_20_Foil(Foil):
             (self.thickness * 100),
         )
 
-    def get_shape_points(self, n):
+    def unit_shape_points(self, n):
         xu, yu, xl, yl = self.load_selig("ara_d_20.dat")
-        c = self.chord
+        return xl, yl, xu, yu
+
+
+# Cosine spaced surfaces of the interpolated foils, shared by every instance.
+# Keyed by (class name, thickness, n), least recently used dropped first.
+g_surface_cache = OrderedDict()
+g_surface_cache_size = 1024
+
+
+class InterpolatedFoil(Foil):
+    """A foil whose surfaces are interpolated through the points xl, yl,
+    xu, yu set in __init__, which depend only on the thickness.
+    """
+
+    def surface_points(self, n):
+        """Cosine spaced x and the lower and upper surfaces at x, before
+        the trailing edge is adjusted. The interpolators are built once
+        per thickness and n.
+        """
+        key = (type(self).__name__, self.thickness, n)
+        surface = g_surface_cache.get(key)
+        if surface is None:
+            l_interp = PchipInterpolator(self.xl, self.yl)
+            u_interp = PchipInterpolator(self.xu, self.yu)
+
+            beta = np.linspace(0, np.pi, n)  # Use cosine spacing of points.
+            x = (1.0 - np.cos(beta)) / 2
+            surface = (x, l_interp(x), u_interp(x))
+            for a in surface:
+                a.setflags(write=False)
+            g_surface_cache[key] = surface
+            if len(g_surface_cache) > g_surface_cache_size:
+                g_surface_cache.popitem(last=False)
+        else:
+            g_surface_cache.move_to_end(key)
+        return surface
+
+    def unit_shape_points(self, n):
+        n = n * 5
+        x, yl, yu = self.surface_points(n)
+        y_offset = np.linspace(0, (self.trailing_edge - self.init_te) / 2, n)
+
+        yl = yl - y_offset
+        yu = yu + y_offset
+        yu[0] = yl[0]
 
-        return [[xl * c, yl * c], [xu * c, yu * c]]
+        return x[::5], yl[::5], x[::5], yu[::5]
 
 
-class ARADFoil_Old(Foil):
+class ARADFoil_Old(InterpolatedFoil):
     """ Interpolate between thickness 0.06 and 0.2 """
 
     def __init__(self, chord, thickness):
         Foil.__init__(self, chord, thickness)
+        # The registry arrays are shared, so scale copies of them
         if self.thickness <= 0.06:
-            self.xl, self.yl, self.xu, self.yu = self.load_selig("ara_d_6.dat")
-            self.yu *= self.thickness / 0.06
-            self.yl *= self.thickness / 0.06
+            self.xl, yl, self.xu, yu = self.load_selig("ara_d_6.dat")
+            scale = self.thickness / 0.06
         elif self.thickness <= 0.10:
-            self.xl, self.yl, self.xu, self.yu = self.load_selig("ara_d_10.dat")
-            self.yu *= self.thickness / 0.1
-            self.yl *= self.thickness / 0.1
+            self.xl, yl, self.xu, yu = self.load_selig("ara_d_10.dat")
+            scale = self.thickness / 0.1
         elif self.thickness <= 0.13:
-            self.xl, self.yl, self.xu, self.yu = self.load_selig("ara_d_13.dat")
-            self.yu *= self.thickness / 0.13
-            self.yl *= self.thickness / 0.13
+            self.xl, yl, self.xu, yu = self.load_selig("ara_d_13.dat")
+            scale = self.thickness / 0.13
         else:
-            self.xl, self.yl, self.xu, self.yu = self.load_selig("ara_d_20.dat")
-            self.yu *= self.thickness / 0.2
-            self.yl *= self.thickness / 0.2
+            self.xl, yl, self.xu, yu = self.load_selig("ara_d_20.dat")
+            scale = self.thickness / 0.2
+        self.yu = yu * scale
+        self.yl = yl * scale
         self.init_te = self.yu[-1] - self.yl[-1]
 
     def hash(self):
@@ -137,40 +186,6 @@ class ARADFoil_Old(Foil):
             hsh,
         )
 
-    def get_shape_points(self, n):
-        c = self.chord
-        # Interpolate the points
-        l_interp = PchipInterpolator(self.xl, self.yl)
-        u_interp = PchipInterpolator(self.xu, self.yu)
-
-        n = n * 5
-        beta = np.linspace(0, np.pi, n)  # Use cosine spacing of points.
-        x = (1.0 - np.cos(beta)) / 2
-
-        xl = x
-        xu = x
-        y_offset = np.linspace(0, (self.trailing_edge - self.init_te) / 2, n)
-
-        yl = l_interp(xl) - y_offset
-        yu = u_interp(xu) + y_offset
-
-        if False:
-            max_x = xu[np.argmax(yu)]  # 0.3
-            if max_x > 0.5:
-                max_x = 0.5
-            max_y = np.max(yu)
-            # print np.max(yu), max_y, np.argmax(yu)
-
-            xu = xu - max_x
-            xl = xl - max_x
-
-            yu = yu - max_y
-            yl = yl - max_y
-
-        yu[0] = yl[0]
-
-        return [[xl[::5] * c, yl[::5] * c], [xu[::5] * c, yu[::5] * c]]
-
 
 from scipy.interpolate import (
     NearestNDInterpolator,
@@ -182,25 +197,63 @@ g_linterp = None
 g_uinterp = None
 g_x0 = None
 g_x1 = None
+g_table = None
 
 
-class ARADFoil(Foil):
-    """ Interpolate between thickness 0.06 and 0.2 """
+class ARADFoil(InterpolatedFoil):
+    """Interpolate between thickness 0.06 and 0.2
+
+    The surfaces come from a table on a regular (thickness, x) grid,
+    sampled once from the interpolator over the ARA-D sections and
+    shipped in the foils package. A section is a linear blend of the two
+    table rows either side of its thickness.
+    """
+
+    table_file = "ara_d_table.npz"
 
     def __init__(self, chord, thickness):
         Foil.__init__(self, chord, thickness)
-        self.linterp, self.uinterp, x0, x1 = ARADFoil.load_interpolator()
-        self.xl = np.linspace(x0, x1, 60)
-        self.xu = np.linspace(x0, x1, 60)
-        t_pts = np.ones(60) * thickness
-        # print t_pts
-        self.yl = self.linterp(np.transpose([t_pts, self.xl]))
-        self.yu = self.uinterp(np.transpose([t_pts, self.xu]))
-        # print self.xl, self.yl
-        # print self.xu, self.yu
-        # print x0, x1
+        t, x, lower, upper = ARADFoil.load_table()
+        self.xl = x
+        self.xu = x
+        i = int(np.clip(np.searchsorted(t, thickness) - 1, 0, len(t) - 2))
+        w = np.clip((thickness - t[i]) / (t[i + 1] - t[i]), 0.0, 1.0)
+        self.yl = (1.0 - w) * lower[i] + w * lower[i + 1]
+        self.yu = (1.0 - w) * upper[i] + w * upper[i + 1]
         self.init_te = self.yu[-1] - self.yl[-1]
 
+    @staticmethod
+    def load_table():
+        """ Thickness grid, x, and the lower and upper surface tables """
+        global g_table
+        if g_table is not None:
+            return g_table
+        try:
+            with pkg_resources.open_binary(foils, ARADFoil.table_file) as fd:
+                data = np.load(fd)
+                g_table = tuple(data[k] for k in ("t", "x", "lower", "upper"))
+        except FileNotFoundError:
+            logger.warning("No {}, building it".format(ARADFoil.table_file))
+            g_table = ARADFoil.build_table()
+        return g_table
+
+    @staticmethod
+    def build_table(n_x=60):
+        """Sample the scattered data interpolator on a grid, finely over
+        the working thicknesses and coarsely over the thick extrapolation.
+        """
+        linterp, uinterp, x0, x1 = ARADFoil.load_interpolator()
+        t = np.concatenate((np.arange(0.0, 0.25, 0.001), np.linspace(0.25, 1.0, 76)))
+        x = np.linspace(x0, x1, n_x)
+        pts = np.stack(np.meshgrid(t, x, indexing="ij"), axis=-1)
+        return t, x, linterp(pts), uinterp(pts)
+
+    @staticmethod
+    def save_table(filename):
+        """ Regenerate the shipped table, after the .dat files change """
+        t, x, lower, upper = ARADFoil.build_table()
+        np.savez(filename, t=t, x=x, lower=lower, upper=upper)
+
     @staticmethod
     def polyfit(x, y):
         coeff = np.polyfit(x, y, 12)
@@ -285,41 +338,6 @@ class ARADFoil(Foil):
             hsh,
         )
 
-    def get_shape_points(self, n):
-        # return [self.xl, self.yl], [self.xu, self.yu]
-        c = self.chord
-        # Interpolate the points
-        l_interp = PchipInterpolator(self.xl, self.yl)
-        u_interp = PchipInterpolator(self.xu, self.yu)
-
-        n = n * 5
-        beta = np.linspace(0, np.pi, n)  # Use cosine spacing of points.
-        x = (1.0 - np.cos(beta)) / 2
-
-        xl = x
-        xu = x
-        y_offset = np.linspace(0, (self.trailing_edge - self.init_te) / 2, n)
-
-        yl = l_interp(xl) - y_offset
-        yu = u_interp(xu) + y_offset
-
-        if False:
-            max_x = xu[np.argmax(yu)]  # 0.3
-            if max_x > 0.5:
-                max_x = 0.5
-            max_y = np.max(yu)
-            # print np.max(yu), max_y, np.argmax(yu)
-
-            xu = xu - max_x
-            xl = xl - max_x
-
-            yu = yu - max_y
-            yl = yl - max_y
-
-        yu[0] = yl[0]
-
-        return [[xl[::5] * c, yl[::5] * c], [xu[::5] * c, yu[::5] * c]]
-
 
 if __name__ == "__main__":
     chord = 12.0 / 1000
@@ -0,0 +1,217 @@
+"""
+    Airfoil families
+
+    A family is a set of coordinate files, each tagged with its thickness
+    (and optionally its camber). The members are resampled once onto a
+    common cosine spaced grid, and a section anywhere in the family is a
+    multilinear blend of the neighbouring members. Below the thinnest and
+    above the thickest member the nearest member is scaled in thickness.
+
+    Families are described in a small json file,
+
+        {"name": "ARA-D",
+         "members": [{"file": "ara_d_6.dat", "thickness": 0.06}, ...]}
+
+    where camber, if given, must be given for every member and the members
+    must cover every (thickness, camber) combination.
+"""
+import os
+import json
+import hashlib
+
+import numpy as np
+from scipy.interpolate import PchipInterpolator
+
+import logging
+
+from proply.foil import Foil
+from proply.foil_registry import foil_registry
+
+logger = logging.getLogger(__name__)
+
+
+def cosine_spacing(n):
+    beta = np.linspace(0, np.pi, n)  # Use cosine spacing of points.
+    return (1.0 - np.cos(beta)) / 2
+
+
+def bracket(values, q):
+    """Indices either side of each q in the sorted values, and the weight
+    of the upper one, clipped to the ends.
+    """
+    if len(values) == 1:
+        zero = np.zeros(len(q), dtype=int)
+        return zero, zero, np.zeros(len(q))
+    i = np.clip(np.searchsorted(values, q) - 1, 0, len(values) - 2)
+    w = np.clip((q - values[i]) / (values[i + 1] - values[i]), 0.0, 1.0)
+    return i, i + 1, w
+
+
+class FoilFamily:
+    """Sections interpolated between tagged member foils.
+
+    members is a list of (filename, thickness) or (filename, thickness,
+    camber). The filenames are anything foil_registry can find.
+    """
+
+    def __init__(self, name, members):
+        self.name = name
+        self.files = [m[0] for m in members]
+        self.has_camber = len(members[0]) > 2
+        if any((len(m) > 2) != self.has_camber for m in members):
+            raise ValueError("Give camber for all members of {} or none".format(name))
+
+        self.thicknesses = np.unique([m[1] for m in members])
+        self.cambers = np.unique([m[2] for m in members]) if self.has_camber else np.zeros(1)
+
+        # Member index at each (thickness, camber) grid point
+        self.index = -np.ones((len(self.thicknesses), len(self.cambers)), dtype=int)
+        for k, m in enumerate(members):
+            i = np.searchsorted(self.thicknesses, m[1])
+            j = np.searchsorted(self.cambers, m[2]) if self.has_camber else 0
+            self.index[i, j] = k
+        if np.any(self.index < 0):
+            raise ValueError("Members of {} do not cover a thickness/camber grid".format(name))
+
+        self.surfaces = [self.load_member(f) for f in self.files]
+        self.grids = {}
+        self.family_hash = self.canonical_hash()
+
+    @staticmethod
+    def load_json(filename):
+        with open(filename, "r") as fd:
+            desc = json.load(fd)
+        members = []
+        # Member files next to the json are read from there, not the package
+        here = os.path.dirname(os.path.abspath(filename))
+        for m in desc["members"]:
+            path = os.path.join(here, m["file"])
+            member = [path if os.path.exists(path) else m["file"], float(m["thickness"])]
+            if "camber" in m:
+                member.append(float(m["camber"]))
+            members.append(member)
+        return FoilFamily(desc["name"], members)
+
+    @staticmethod
+    def load_member(filename):
+        """ Interpolators for the lower and upper surface, on a unit chord """
+        xl, yl, xu, yu = foil_registry.get(filename)
+        x0 = min(xl[0], xu[0])
+        c = max(xl[-1], xu[-1]) - x0
+
+        def unique(x, y):
+            x, index = np.unique((np.asarray(x) - x0) / c, return_index=True)
+            return x, np.asarray(y)[index] / c
+
+        return PchipInterpolator(*unique(xl, yl)), PchipInterpolator(*unique(xu, yu))
+
+    def grid(self, n):
+        """x and the lower, upper surfaces (thicknesses, cambers, n) of
+        every member, resampled once per n.
+        """
+        g = self.grids.get(n)
+        if g is None:
+            x = cosine_spacing(n)
+            lower = np.array([l(x) for l, u in self.surfaces])[self.index]
+            upper = np.array([u(x) for l, u in self.surfaces])[self.index]
+            g = (x, lower, upper)
+            self.grids[n] = g
+        return g
+
+    def canonical_hash(self):
+        """ A hash of the member shapes and tags, not of the file names """
+        x, lower, upper = self.grid(50)
+        h = hashlib.sha1()
+        for a in (self.thicknesses, self.cambers, lower, upper):
+            h.update(np.round(a, 6).tobytes())
+        return h.hexdigest()[:10]
+
+    def sections(self, thickness, camber=None, n=50):
+        """x, and the lower and upper surfaces (S, n) of the sections with
+        the given thicknesses (and cambers).
+        """
+        thickness = np.atleast_1d(np.asarray(thickness, dtype=float))
+        if camber is None:
+            camber = np.zeros_like(thickness)
+        camber = np.broadcast_to(np.asarray(camber, dtype=float), thickness.shape)
+        x, lower, upper = self.grid(n)
+
+        t0, t1, w = bracket(self.thicknesses, thickness)
+        c0, c1, v = bracket(self.cambers, camber)
+        scale = np.ones_like(thickness)
+        thin = thickness < self.thicknesses[0]
+        thick = thickness > self.thicknesses[-1]
+        scale[thin] = thickness[thin] / self.thicknesses[0]
+        scale[thick] = thickness[thick] / self.thicknesses[-1]
+
+        w = w[:, None]
+        v = v[:, None]
+        s = scale[:, None]
+
+        def blend(y):
+            return s * (
+                (1 - w) * (1 - v) * y[t0, c0]
+                + w * (1 - v) * y[t1, c0]
+                + (1 - w) * v * y[t0, c1]
+                + w * v * y[t1, c1]
+            )
+
+        return x, blend(lower), blend(upper)
+
+    def foil_class(self):
+        """ A Foil class for this family, e.g. for Prop.new_blade_element """
+        return type("FamilyFoil_" + self.family_hash, (FamilyFoil,), {"family": self})
+
+    def __repr__(self):
+        return "FoilFamily {} ({} members) hsh={}".format(
+            self.name, len(self.files), self.family_hash
+        )
+
+
+class FamilyFoil(Foil):
+    """ A section of a FoilFamily """
+
+    family = None
+
+    def __init__(self, chord, thickness, camber=0.0):
+        Foil.__init__(self, chord, thickness)
+        self.camber = camber
+        x, yl, yu = self.family.sections(thickness, camber, 2)
+        self.init_te = yu[0, -1] - yl[0, -1]
+
+    def shape_key(self, n):
+        return (
+            "FAM_" + self.family.family_hash,
+            self.thickness,
+            self.camber,
+            self.trailing_edge,
+            n,
+        )
+
+    def hash(self):
+        """ Generate a unique hash for this foil"""
+        return "FAM_%s %5.2f,%5.2f,%5.2f" % (
+            self.family.family_hash,
+            self.thickness,
+            self.camber,
+            self.trailing_edge,
+        )
+
+    def __repr__(self):
+        return "{} ch={:5.1f}mm, thickness={:4.2f}% camber={:4.2f}% te={:4.3f} hsh={}".format(
+            self.family.name,
+            self.chord * 1000,
+            self.thickness * 100,
+            self.camber * 100,
+            self.trailing_edge,
+            self.hash(),
+        )
+
+    def unit_shape_points(self, n):
+        x, yl, yu = self.family.sections(self.thickness, self.camber, n)
+        y_offset = np.linspace(0, (self.trailing_edge - self.init_te) / 2, n)
+        yl = yl[0] - y_offset
+        yu = yu[0] + y_offset
+        yu[0] = yl[0]
+        return x, yl, x, yu
+
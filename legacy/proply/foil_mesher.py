@@ -0,0 +1,273 @@
+"""
+    2-D CFD meshes of foil sections
+
+    Any Foil is meshed in a rectangular domain at unit chord, with a
+    boundary layer on the foil and a refined box for the wake. The
+    geometry is written as a gmsh .geo script and meshed by gmsh, the
+    Python module if it is installed or else the gmsh program.
+
+    Finished meshes are cached on disk, keyed by a hash of the unit chord
+    section shape and the settings, so a section that has been meshed
+    before, in this design or any other, is not meshed again. The
+    sections of a blade are meshed in parallel worker processes.
+"""
+import os
+import hashlib
+import subprocess
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import logging
+
+from proply.foil_registry import cache_root
+
+try:
+    import gmsh
+except ImportError:
+    gmsh = None
+
+logger = logging.getLogger(__name__)
+
+
+class MeshSettings:
+    """Domain and mesh sizes, all in chords.
+
+    The domain reaches left, right, top and bottom of the foil. Cells are
+    surface_size on the foil and grow to far_size at the far field. The
+    boundary layer starts at first_layer and grows by growth up to
+    bl_thickness. The wake box runs wake_length behind the trailing edge,
+    wake_width wide, with cells of wake_size. n is the number of section
+    points along each surface.
+    """
+
+    def __init__(
+        self,
+        left=5.0,
+        right=10.0,
+        top=5.0,
+        bottom=5.0,
+        surface_size=0.005,
+        far_size=0.5,
+        first_layer=1e-4,
+        growth=1.2,
+        bl_thickness=0.02,
+        wake_length=3.0,
+        wake_width=0.2,
+        wake_size=0.02,
+        n=150,
+    ):
+        self.left = left
+        self.right = right
+        self.top = top
+        self.bottom = bottom
+        self.surface_size = surface_size
+        self.far_size = far_size
+        self.first_layer = first_layer
+        self.growth = growth
+        self.bl_thickness = bl_thickness
+        self.wake_length = wake_length
+        self.wake_width = wake_width
+        self.wake_size = wake_size
+        self.n = n
+
+    def key(self):
+        return ",".join("{}={!r}".format(k, v) for k, v in sorted(vars(self).items()))
+
+    def __repr__(self):
+        return "MeshSettings({})".format(self.key())
+
+
+def unit_shape(foil, n):
+    """ xl, yl, xu, yu of the foil section at unit chord """
+    (xl, yl), (xu, yu) = foil.get_shape_points(n)
+    c = foil.chord
+    return xl / c, yl / c, xu / c, yu / c
+
+
+def foil_geo(shape, settings, name="foil"):
+    """A gmsh .geo script meshing the domain round a unit chord section
+    shape (xl, yl, xu, yu), both surfaces running from the leading edge.
+    """
+    s = settings
+    xl, yl, xu, yu = shape
+    lines = ["// proply section mesh: {}".format(name), "// {}".format(s.key())]
+
+    def point(k, x, y, size):
+        lines.append("Point({}) = {{{!r}, {!r}, 0, {!r}}};".format(k, float(x), float(y), size))
+
+    n = len(xl)
+    closed_te = abs(yu[-1] - yl[-1]) < 1e-9 and abs(xu[-1] - xl[-1]) < 1e-9
+    # Points 1..n the lower surface, the upper shares the leading edge
+    for k in range(n):
+        point(k + 1, xl[k], yl[k], s.surface_size)
+    upper = [1]
+    for k in range(1, n - 1):
+        point(n + k, xu[k], yu[k], s.surface_size)
+        upper.append(n + k)
+    if closed_te:
+        upper.append(n)
+    else:
+        point(2 * n - 1, xu[-1], yu[-1], s.surface_size)
+        upper.append(2 * n - 1)
+
+    def ids(values):
+        return ", ".join(str(v) for v in values)
+
+    lines.append("Spline(1) = {{{}}};".format(ids(range(1, n + 1))))
+    lines.append("Spline(2) = {{{}}};".format(ids(upper)))
+    foil_curves = [1, -2]
+    if not closed_te:
+        lines.append("Line(3) = {{{}, {}}};".format(n, upper[-1]))
+        foil_curves = [1, 3, -2]
+
+    corners = [
+        (-s.left, -s.bottom),
+        (1.0 + s.right, -s.bottom),
+        (1.0 + s.right, s.top),
+        (-s.left, s.top),
+    ]
+    p0 = 2 * n + 1
+    for k, (x, y) in enumerate(corners):
+        point(p0 + k, x, y, s.far_size)
+    for k in range(4):
+        lines.append("Line({}) = {{{}, {}}};".format(11 + k, p0 + k, p0 + (k + 1) % 4))
+
+    lines += [
+        "Curve Loop(1) = {11, 12, 13, 14};",
+        "Curve Loop(2) = {{{}}};".format(ids(foil_curves)),
+        "Plane Surface(1) = {1, 2};",
+        'Physical Curve("airfoil") = {{{}}};'.format(ids(abs(c) for c in foil_curves)),
+        'Physical Curve("farfield") = {11, 12, 13, 14};',
+        'Physical Surface("fluid") = {1};',
+        "",
+        "Field[1] = BoundaryLayer;",
+        "Field[1].CurvesList = {{{}}};".format(ids(abs(c) for c in foil_curves)),
+        "Field[1].Size = {!r};".format(s.first_layer),
+        "Field[1].Ratio = {!r};".format(s.growth),
+        "Field[1].Thickness = {!r};".format(s.bl_thickness),
+        "Field[1].Quads = 1;",
+    ]
+    if closed_te:
+        lines.append("Field[1].FanPointsList = {{{}}};".format(n))
+    lines += [
+        "BoundaryLayer Field = 1;",
+        "",
+        "Field[2] = Distance;",
+        "Field[2].CurvesList = {{{}}};".format(ids(abs(c) for c in foil_curves)),
+        "Field[2].Sampling = 200;",
+        "Field[3] = Threshold;",
+        "Field[3].InField = 2;",
+        "Field[3].SizeMin = {!r};".format(s.surface_size),
+        "Field[3].SizeMax = {!r};".format(s.far_size),
+        "Field[3].DistMin = {!r};".format(s.bl_thickness),
+        "Field[3].DistMax = {!r};".format(min(s.left, s.top, s.bottom)),
+        "Field[4] = Box;",
+        "Field[4].VIn = {!r};".format(s.wake_size),
+        "Field[4].VOut = {!r};".format(s.far_size),
+        "Field[4].XMin = 1;",
+        "Field[4].XMax = {!r};".format(1.0 + s.wake_length),
+        "Field[4].YMin = {!r};".format(-s.wake_width / 2),
+        "Field[4].YMax = {!r};".format(s.wake_width / 2),
+        "Field[4].Thickness = {!r};".format(s.wake_width),
+        "Field[5] = Min;",
+        "Field[5].FieldsList = {3, 4};",
+        "Background Field = 5;",
+        "",
+        "Mesh.MeshSizeExtendFromBoundary = 0;",
+        "Mesh.MeshSizeFromPoints = 0;",
+        "Mesh.MeshSizeFromCurvature = 0;",
+        "Mesh.Algorithm = 6;",
+    ]
+    return "\n".join(lines) + "\n"
+
+
+def run_gmsh(geo_path, msh_path):
+    """Mesh a .geo script into msh_path, written under a temporary name
+    and renamed so an interrupted run leaves nothing in the cache.
+    """
+    tmp = "{}.{}.msh".format(msh_path[: -len(".msh")], os.getpid())
+    if gmsh is not None:
+        gmsh.initialize()
+        try:
+            gmsh.option.setNumber("General.Terminal", 0)
+            gmsh.open(geo_path)
+            gmsh.model.mesh.generate(2)
+            gmsh.write(tmp)
+        finally:
+            gmsh.finalize()
+    else:
+        subprocess.run(
+            ["gmsh", geo_path, "-2", "-o", tmp],
+            check=True,
+            stdout=subprocess.DEVNULL,
+        )
+    os.replace(tmp, msh_path)
+    return msh_path
+
+
+class FoilMesher:
+    """Mesh foils with one MeshSettings, caching the meshes by shape.
+
+    workers is the number of gmsh processes (None for one per cpu).
+    """
+
+    def __init__(self, settings=None, cache_dir=None, workers=None):
+        self.settings = MeshSettings() if settings is None else settings
+        if cache_dir is None:
+            cache_dir = os.path.join(cache_root(), "meshes")
+        self.cache_dir = cache_dir
+        self.workers = workers
+
+    def mesh_key(self, shape):
+        """ A hash of the unit chord section points and the settings """
+        h = hashlib.sha1()
+        for a in shape:
+            h.update(np.round(np.asarray(a, dtype=float), 8).tobytes())
+        h.update(self.settings.key().encode())
+        return h.hexdigest()[:16]
+
+    def cache_path(self, key, ext=".msh"):
+        return os.path.join(self.cache_dir, key + ext)
+
+    def prepare(self, foil):
+        """ The cache key of a foil's mesh, writing its .geo if not meshed yet """
+        shape = unit_shape(foil, self.settings.n)
+        key = self.mesh_key(shape)
+        if not os.path.exists(self.cache_path(key)):
+            os.makedirs(self.cache_dir, exist_ok=True)
+            with open(self.cache_path(key, ".geo"), "w") as fd:
+                fd.write(foil_geo(shape, self.settings, repr(foil)))
+        return key
+
+    def mesh(self, foil):
+        """ The .msh file for one foil """
+        return self.mesh_all([foil])[0]
+
+    def mesh_all(self, foils):
+        """The .msh files for the foils, in order. Sections that are not
+        in the cache are meshed in parallel, each distinct shape once.
+        """
+        keys = [self.prepare(f) for f in foils]
+        todo = sorted(set(k for k in keys if not os.path.exists(self.cache_path(k))))
+        logger.info(
+            "Meshing {} of {} sections ({} cached)".format(
+                len(todo), len(foils), len(set(keys)) - len(todo)
+            )
+        )
+        if len(todo) == 1 or self.workers == 1:
+            for k in todo:
+                run_gmsh(self.cache_path(k, ".geo"), self.cache_path(k))
+        elif todo:
+            with ProcessPoolExecutor(max_workers=self.workers) as pool:
+                jobs = [
+                    pool.submit(run_gmsh, self.cache_path(k, ".geo"), self.cache_path(k))
+                    for k in todo
+                ]
+                for job in jobs:
+                    job.result()
+        return [self.cache_path(k) for k in keys]
+
+    def mesh_blade(self, prop):
+        """ The .msh files of every blade element section, hub first """
+        return self.mesh_all([be.foil for be in prop.blade_elements])
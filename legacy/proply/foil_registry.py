@@ -0,0 +1,224 @@
+"""
+    Registry of airfoil coordinate files
+
+    Selig and Lednicer .dat files (the packaged ones in proply/foils, or any
+    file on disk) are parsed once, checked, and kept in memory by name.
+    The parsed arrays are also cached on disk, keyed by a hash of the file
+    contents, so a new process maps the arrays in instead of parsing again.
+
+    The on disk cache is a single .npy per file (counts followed by the
+    coordinates), rather than an .npz, because numpy can only memory map
+    .npy files.
+"""
+import os
+import re
+import hashlib
+
+import numpy as np
+
+try:
+    import importlib.resources as pkg_resources
+except ImportError:
+    # Try backported to PY<37 `importlib_resources`.
+    import importlib_resources as pkg_resources
+
+import logging
+
+from proply import foils
+
+logger = logging.getLogger(__name__)
+
+g_number = re.compile(r"[-+]?(?:[0-9]+\.?[0-9]*|\.[0-9]+)(?:[eE][-+]?[0-9]+)?")
+
+
+def coordinate_lines(text):
+    """ The lines of a .dat file that start with two numbers, as (x, y) """
+    points = []
+    for line in text.split("\n"):
+        pts = g_number.findall(line)
+        if len(pts) >= 2 and g_number.fullmatch(line.split()[0]):
+            points.append((float(pts[0]), float(pts[1])))
+        else:
+            logger.debug("No information on line {}".format(line))
+    return points
+
+
+def parse_dat(text):
+    """Parse Selig or Lednicer coordinates.
+
+    Returns xl, yl, xu, yu with both surfaces running from the leading
+    edge to the trailing edge, upper first in the file for Selig (as
+    Foil.load_selig has always returned them).
+    """
+    points = coordinate_lines(text)
+    if len(points) < 3:
+        raise ValueError("Too few coordinates in airfoil file")
+
+    # Lednicer: the first line holds the point counts of each surface
+    n_upper, n_lower = points[0]
+    if n_upper > 1.5 and n_lower > 1.5:
+        n_upper = int(n_upper)
+        n_lower = int(n_lower)
+        first = np.array(points[1 : 1 + n_upper])
+        second = np.array(points[1 + n_upper : 1 + n_upper + n_lower])
+        if len(first) != n_upper or len(second) != n_lower:
+            raise ValueError("Lednicer point counts do not match the file")
+        xu, yu = first[:, 0], first[:, 1]
+        xl, yl = second[:, 0], second[:, 1]
+    else:
+        # Selig: trailing edge, round the leading edge, back to the trailing edge
+        xu, yu, xl, yl = [], [], [], []
+        x_prev = 9e99
+        for x0, y0 in points:
+            if x0 < x_prev:
+                xu.append(x0)
+                yu.append(y0)
+            else:
+                xl.append(x0)
+                yl.append(y0)
+            x_prev = x0
+        xu.reverse()
+        yu.reverse()
+        xl, yl, xu, yu = [np.array(a) for a in (xl, yl, xu, yu)]
+
+    for x in (xl, xu):
+        if np.any(np.diff(x) < 0):
+            raise ValueError("Airfoil surface x coordinates are not monotonic")
+
+    # The first surface should be the upper one. Compare at common x.
+    x = np.linspace(max(xl[0], xu[0]), min(xl[-1], xu[-1]), 20)
+    if np.mean(np.interp(x, xu, yu)) < np.mean(np.interp(x, xl, yl)):
+        logger.warning("Airfoil file lists the lower surface first, swapping")
+        xl, yl, xu, yu = xu, yu, xl, yl
+
+    return xl, yl, xu, yu
+
+
+def cache_root():
+    """ The proply disk cache, $PROPLY_CACHE or ~/.cache/proply """
+    return os.environ.get(
+        "PROPLY_CACHE", os.path.join(os.path.expanduser("~"), ".cache", "proply")
+    )
+
+
+class FoilRegistry:
+    """Parsed airfoil coordinates by name.
+
+    A name is a packaged file (e.g. "ara_d_6" or "ara_d_6.dat"), or a
+    path to a file on disk, or whatever name it was registered under.
+    A bare file name is a packaged foil: it is only read from disk when it
+    has a directory (e.g. "./my_foil.dat") or on_disk is given, so a file
+    in the working directory never shadows a packaged one. Files from disk
+    are kept under their name and a hash of their contents, so different
+    files with the same base name do not share an entry.
+    """
+
+    def __init__(self, cache_dir=None):
+        if cache_dir is None:
+            cache_dir = cache_root()
+        self.cache_dir = os.path.join(cache_dir, "foils")
+        self.foils = {}
+
+    @staticmethod
+    def canonical_name(name):
+        name = os.path.basename(name)
+        if name.endswith(".dat"):
+            name = name[:-4]
+        return name.lower()
+
+    @staticmethod
+    def is_path(name, on_disk=False):
+        """ Whether name is read from disk rather than the package """
+        return on_disk or os.path.dirname(name) != ""
+
+    def read(self, name, on_disk=False):
+        """ The text of a file on disk (see is_path), or of a packaged foil """
+        if self.is_path(name, on_disk):
+            with open(name, "r") as fd:
+                return fd.read()
+        filename = self.canonical_name(name) + ".dat"
+        fd = pkg_resources.open_text(foils, filename)
+        text = fd.read()
+        fd.close()
+        return text
+
+    @staticmethod
+    def digest(text):
+        return hashlib.sha1(text.encode()).hexdigest()
+
+    def file_key(self, name, digest):
+        """ The key of a file from disk: its name and a hash of its contents """
+        return "{}@{}".format(self.canonical_name(name), digest)
+
+    def parse(self, text, digest):
+        """ Parsed coordinates of text, mapped from the disk cache if there """
+        coords = self.load_cache(digest)
+        if coords is None:
+            coords = parse_dat(text)
+            self.save_cache(digest, coords)
+        return coords
+
+    def register(self, filename, name=None, on_disk=False):
+        """ Parse (or map from the disk cache) a coordinate file """
+        text = self.read(filename, on_disk)
+        digest = self.digest(text)
+        coords = self.parse(text, digest)
+
+        if name is not None:
+            key = self.canonical_name(name)
+        elif self.is_path(filename, on_disk):
+            key = self.file_key(filename, digest)
+        else:
+            key = self.canonical_name(filename)
+        self.foils[key] = coords
+        return coords
+
+    def get(self, name, on_disk=False):
+        """xl, yl, xu, yu for a foil, registering it on first use. A file
+        from disk is read each time to check its contents, but only
+        parsed once.
+        """
+        if self.is_path(name, on_disk):
+            text = self.read(name, on_disk=True)
+            digest = self.digest(text)
+            key = self.file_key(name, digest)
+            coords = self.foils.get(key)
+            if coords is None:
+                coords = self.parse(text, digest)
+                self.foils[key] = coords
+            return coords
+        coords = self.foils.get(self.canonical_name(name))
+        if coords is None:
+            coords = self.register(name)
+        return coords
+
+    def names(self):
+        return sorted(self.foils.keys())
+
+    def cache_path(self, digest):
+        return os.path.join(self.cache_dir, digest + ".npy")
+
+    def load_cache(self, digest):
+        path = self.cache_path(digest)
+        if not os.path.exists(path):
+            return None
+        data = np.load(path, mmap_mode="r")
+        nl = int(data[0])
+        nu = int(data[1])
+        ends = np.cumsum([2, nl, nl, nu, nu])
+        return tuple(data[ends[i] : ends[i + 1]] for i in range(4))
+
+    def save_cache(self, digest, coords):
+        xl, yl, xu, yu = coords
+        data = np.concatenate(([len(xl), len(xu)], xl, yl, xu, yu))
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            tmp = self.cache_path(digest) + ".{}.tmp".format(os.getpid())
+            with open(tmp, "wb") as fd:
+                np.save(fd, data)
+            os.replace(tmp, self.cache_path(digest))
+        except OSError as e:
+            logger.info("Not caching foil coordinates: {}".format(e))
+
+
+foil_registry = FoilRegistry()
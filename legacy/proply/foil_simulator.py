@@ -5,10 +5,20 @@
     
     Copyright 2016-2017
     
-    Two classes are in here. The PlateSimulatedFoil returns C_L and C_D assuming the
+    Three classes are in here. The PlateSimulatedFoil returns C_L and C_D assuming the
     foil is a plate. Its quick and pretty rough.
     
     The XfoilSimulatedFoil uses the xfoil program to generate polars. Its slower and more accurate.
+
+    The PanelSimulatedFoil uses the NumPy panel method in panel_method.py. It sits in
+    between: much faster than xfoil, good enough for early design iterations.
+
+    The SurrogateSimulatedFoil answers from a regression model fitted to every xfoil
+    polar in the database, and falls back to xfoil where the model is unsure.
+
+    The TieredSimulatedFoil switches between the three, so an optimizer can run on the
+    cheap tiers first and only escalate to xfoil once it has converged. Its plate tier is
+    the PlateTierSimulatedFoil, a plate whose drag stays positive at negative alpha.
     
     
     TODO: Use some CFD to do the job better?
@@ -16,10 +26,12 @@
 """
 
 import numpy as np
-from scipy.optimize import brentq
+from collections import OrderedDict
 
 import logging
 from proply import xfoil_old
+from proply.panel_method import PanelSolver
+from proply import polar_surrogate
 
 try:
     import importlib.resources as pkg_resources
@@ -31,6 +43,66 @@ except ImportError:
 logger = logging.getLogger(__name__)
 
 
+class PolarMetrics:
+    """ Characteristic points of one polar, computed once from the
+        tabulated (alpha, cl, cd) data when the polar is loaded.
+
+        - zero_lift_alpha. Angle of attack where Cl crosses zero.
+        - cl_max, cl_max_alpha. Maximum lift and where it occurs (stall).
+        - best_ld, best_ld_alpha. Maximum Cl/Cd and where it occurs.
+    """
+
+    def __init__(self, alpha, cl, cd):
+        alpha = np.asarray(alpha, dtype=float)
+        cl = np.asarray(cl, dtype=float)
+        cd = np.asarray(cd, dtype=float)
+        order = np.argsort(alpha)
+        alpha = alpha[order]
+        cl = cl[order]
+        cd = cd[order]
+
+        self.zero_lift_alpha = PolarMetrics.zero_crossing(alpha, cl)
+
+        i = np.argmax(cl)
+        self.cl_max = cl[i]
+        self.cl_max_alpha = alpha[i]
+
+        ld = np.full(alpha.shape, -np.inf)
+        drag = cd > 0
+        ld[drag] = cl[drag] / cd[drag]
+        i = np.argmax(ld)
+        self.best_ld = ld[i]
+        self.best_ld_alpha = alpha[i]
+
+    @staticmethod
+    def zero_crossing(alpha, cl):
+        """ The upward zero crossing of cl nearest alpha=0, interpolated
+            linearly between the bracketing points. If the data never
+            crosses zero, extrapolate a straight line fitted over +/- 5 degrees.
+        """
+        idx = np.where((cl[:-1] <= 0) & (cl[1:] > 0))[0]
+        if len(idx) > 0:
+            i = idx[np.argmin(np.abs(alpha[idx]))]
+            a0, a1 = alpha[i], alpha[i + 1]
+            c0, c1 = cl[i], cl[i + 1]
+            return a0 - c0 * (a1 - a0) / (c1 - c0)
+
+        linear = np.abs(alpha) <= np.radians(5.0)
+        if np.count_nonzero(linear) < 2:
+            linear = np.ones(alpha.shape, dtype=bool)
+        slope, offset = np.polyfit(alpha[linear], cl[linear], 1)
+        return -offset / slope
+
+    def __repr__(self):
+        return "PolarMetrics(alpha_0={:5.2f}, cl_max={:4.2f} at {:5.2f}, L/D={:5.1f} at {:5.2f})".format(
+            np.degrees(self.zero_lift_alpha),
+            self.cl_max,
+            np.degrees(self.cl_max_alpha),
+            self.best_ld,
+            np.degrees(self.best_ld_alpha),
+        )
+
+
 class SimulatedFoil:
     def __init__(self, foil):
         self.foil = foil
@@ -43,9 +115,22 @@ class SimulatedFoil:
 
 
 class PlateSimulatedFoil(SimulatedFoil):
+    plate_metrics = None
+
     def get_zero_cl_angle(self, v):
-        zero = 0.1
-        return zero
+        return self.get_polar_metrics(v).zero_lift_alpha
+
+    def get_polar_metrics(self, v):
+        """ The plate polars do not depend on v, so these are computed once
+            per plate model (each subclass declares its own plate_metrics).
+        """
+        cls = type(self)
+        if cls.plate_metrics is None:
+            alpha = np.radians(np.arange(-20, 20.5, 0.5))
+            cls.plate_metrics = PolarMetrics(
+                alpha, self.get_cl(v, alpha), self.get_cd(v, alpha)
+            )
+        return cls.plate_metrics
 
     def get_cl(self, v, alpha):
         return 2.0 * np.pi * alpha
@@ -54,6 +139,18 @@ class PlateSimulatedFoil(SimulatedFoil):
         return 1.28 * np.sin(alpha)
 
 
+class PlateTierSimulatedFoil(PlateSimulatedFoil):
+    """ The plate model of the first TieredSimulatedFoil tier. Drag opposes
+        the flow at either sign of alpha, with a skin friction floor, so
+        the optimizer is never rewarded for negative angles of attack.
+    """
+
+    plate_metrics = None
+
+    def get_cd(self, v, alpha):
+        return 1.28 * np.abs(np.sin(alpha)) + 0.02
+
+
 from random import choice
 from string import ascii_uppercase
 import os
@@ -62,13 +159,239 @@ import sqlite3
 
 conn_global = None
 
-import xfoil as xf
+try:
+    import xfoil as xf
+except ImportError:
+    # Only needed by XfoilSimulatedFoil for new simulations.
+    xf = None
+
+
+def foil_coordinates(foil, n):
+    """ The X,Y coordinates of the foil shape, which run from the trailing
+        edge, round the leading edge, back to the trailing edge
+    """
+    pl, pu = foil.get_shape_points(n=n)
+    xcoords = np.concatenate((pl[0][::-1], pu[0]), axis=0)
+    ycoords = np.concatenate((pl[1][::-1], pu[1]), axis=0)
+
+    # Chop off overhang.
+    limit = xcoords <= xcoords[0]
+    return xcoords[limit], ycoords[limit]
+
+
+class FoilPolars:
+    """ The polars loaded for one foil hash, keyed by (reynolds, mach).
+
+        Shared by every simulator of an identical section, so a polar is
+        read from the database (or simulated) once per process.
+    """
+
+    # Rough per-object overheads used to estimate the memory footprint
+    ENTRY_BYTES = 512
+    POLAR_BYTES = 256
+    METRICS_BYTES = 384
+
+    def __init__(self, foil_id):
+        self.foil_id = foil_id
+        self.polars = {}
+        self.metrics = {}
+        self.uncertainty = {}
+        self.solver = None
+
+    def nbytes(self):
+        total = FoilPolars.ENTRY_BYTES
+        for polar in self.polars.values():
+            total += FoilPolars.POLAR_BYTES
+            for poly in polar:
+                total += poly.coeffs.nbytes
+        total += FoilPolars.METRICS_BYTES * len(self.metrics)
+        if self.solver is not None:
+            total += self.solver.nbytes()
+        return total
+
+
+class PolarRegistry:
+    """ A size bounded LRU of FoilPolars, keyed by canonical foil hash.
+
+        max_bytes is the memory budget. When it is exceeded the least
+        recently used foils are dropped (simulators still holding them
+        keep working, they just stop being shared).
+    """
+
+    def __init__(self, max_bytes=64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.sizes = {}
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def lookup(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return entry
+
+    def insert(self, key, entry):
+        self.entries[key] = entry
+        self.entries.move_to_end(key)
+        self.resize(key)
+
+    def resize(self, key):
+        """ Re-account the size of an entry (after it has loaded more polars)
+            and evict least recently used entries until we are within budget.
+        """
+        if key not in self.entries:
+            return
+        self.nbytes -= self.sizes.get(key, 0)
+        self.sizes[key] = self.entries[key].nbytes()
+        self.nbytes += self.sizes[key]
+        self.evict(keep=key)
+
+    def evict(self, keep=None):
+        while self.nbytes > self.max_bytes and len(self.entries) > 1:
+            key = next(iter(self.entries))
+            if key == keep:
+                self.entries.move_to_end(key)
+                key = next(iter(self.entries))
+            del self.entries[key]
+            self.nbytes -= self.sizes.pop(key)
+            self.evictions += 1
+            logger.info("Evicted polars for foil {}".format(key))
+
+    def set_max_bytes(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.evict()
+
+    def clear(self):
+        self.entries.clear()
+        self.sizes.clear()
+        self.nbytes = 0
+
+    def stats(self):
+        return {
+            "foils": len(self.entries),
+            "bytes": self.nbytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+    def __repr__(self):
+        return "PolarRegistry(foils={}, {:5.1f}/{:5.1f} kB, hits={}, misses={}, evictions={})".format(
+            len(self.entries),
+            self.nbytes / 1024.0,
+            self.max_bytes / 1024.0,
+            self.hits,
+            self.misses,
+            self.evictions,
+        )
+
+
+polar_registry = PolarRegistry()
+
 
+class CachedSimulatedFoil(PlateSimulatedFoil):
+    """ Base for simulators whose polars are tabulated per (Reynolds, Mach)
+        bucket and shared through the polar_registry.
+
+        Subclasses set source and implement get_polars, which loads the
+        table and hands it to store_polar.
+    """
+
+    source = None
 
-class XfoilSimulatedFoil(PlateSimulatedFoil):
     def __init__(self, foil):
         SimulatedFoil.__init__(self, foil)
         self.hash = foil.hash()
+        self.cache_key = (self.source, self.hash)
+
+        # Share the loaded polars with every other element of this section.
+        # The simulator itself stays per element, as Reynolds number depends
+        # on the chord of self.foil which the hash does not include.
+        self.polars = polar_registry.lookup(self.cache_key)
+        if self.polars is None:
+            self.polars = self.new_polars()
+            polar_registry.insert(self.cache_key, self.polars)
+        self.polar_poly_cache = self.polars.polars
+        self.polar_metrics = self.polars.metrics
+
+    def new_polars(self):
+        return FoilPolars(None)
+
+    def polar_key(self, velocity):
+        return (self.get_reynolds(velocity), self.get_mach(velocity))
+
+    def store_polar(self, key, alpha, cl, cd):
+        """ Fit the tabulated polar, compute its metrics and cache both """
+        cl_poly = np.poly1d(np.polyfit(alpha, cl, 9))
+        cd_poly = np.poly1d(np.polyfit(alpha, cd, 9))
+        self.polar_poly_cache[key] = [cl_poly, cd_poly]
+        self.polar_metrics[key] = PolarMetrics(alpha, cl, cd)
+        logger.info("Polar Re={} Ma={}: {}".format(key[0], key[1], self.polar_metrics[key]))
+        polar_registry.resize(self.cache_key)
+        return [cl_poly, cd_poly]
+
+    def get_zero_cl_angle(self, v):
+        return self.get_polar_metrics(v).zero_lift_alpha
+
+    def get_polar_metrics(self, velocity):
+        """ Zero lift angle, Cl max and best L/D at this velocity. These are
+            computed when the polar is loaded, so this is a dictionary lookup.
+        """
+        key = self.polar_key(velocity)
+        if key not in self.polar_metrics:
+            self.get_polars(velocity)
+        return self.polar_metrics[key]
+
+    def get_cl(self, v, alpha):
+        Ma = self.foil.Mach(v)
+        if Ma > 0.97 or abs(alpha) > np.radians(30) or (self.foil.Reynolds(v) < 30000):
+            return 2.0 * np.pi * alpha
+        cl, cd = self.get_polars(v)
+        return cl(alpha)
+
+    def get_cd(self, v, alpha):
+        Ma = self.foil.Mach(v)
+        if Ma > 0.97 or abs(alpha) > np.radians(30) or (self.foil.Reynolds(v) < 30000):
+            return 1.28 * np.abs(np.sin(alpha)) + 0.02
+
+        cl, cd = self.get_polars(v)
+        return cd(alpha)
+
+    def get_mach(self, velocity):
+        # Round the Mach number to the neares 0.05
+        Ma = np.round(self.foil.Mach(velocity) * 2, 1) / 2
+        return Ma
+
+    def get_reynolds(self, velocity):
+        Re = self.foil.Reynolds(velocity)
+        re_space = np.round(np.geomspace(30000, 2e6, 20), -4)
+        idx = np.argmin(abs(re_space - Re))
+        reynolds = re_space[idx]  # np.round(Re, -4)  # Round to nearest 1000
+
+        if reynolds < 30000.0:
+            reynolds = 30000.0
+
+        return reynolds
+
+
+class XfoilSimulatedFoil(CachedSimulatedFoil):
+    source = "xfoil"
+
+    def __init__(self, foil):
+        CachedSimulatedFoil.__init__(self, foil)
+        self.foil_id = self.polars.foil_id
+
+    def new_polars(self):
+        return FoilPolars(self.lookup_foil_id(self.foil))
+
+    def lookup_foil_id(self, foil):
         conn = self.get_db()
         c = conn.cursor()
         result = c.execute(
@@ -77,15 +400,16 @@ class XfoilSimulatedFoil(PlateSimulatedFoil):
         if result == None:
             c.execute("INSERT INTO foil(hash) VALUES (?)", (self.hash,))
             c.execute("SELECT id FROM foil WHERE (hash=?)", (self.hash,))
-            self.foil_id = c.fetchone()[0]
-            logger.info("Creating Foil In Database, %s, id=%d" % (foil, self.foil_id))
+            foil_id = c.fetchone()[0]
+            logger.info("Creating Foil In Database, %s, id=%d" % (foil, foil_id))
         else:
-            self.foil_id = result[0]
+            foil_id = result[0]
         conn.commit()
         # conn.close()
-        self.polar_poly_cache = {}
+        return foil_id
 
-    def get_db(self):
+    @staticmethod
+    def get_db():
         global conn_global
         if conn_global is None:
             conn_global = sqlite3.connect("foil_simulator.db")
@@ -118,45 +442,6 @@ class XfoilSimulatedFoil(PlateSimulatedFoil):
 
         return conn_global
 
-    def get_zero_cl_angle(self, v):
-        cl, cd = self.get_polars(v)
-        try:
-            zero = brentq(cl, np.radians(-30.0), np.radians(15.0))
-        except:
-            zero = 0.0
-        return zero
-
-    def get_cl(self, v, alpha):
-        Ma = self.foil.Mach(v)
-        if Ma > 0.97 or abs(alpha) > np.radians(30) or (self.foil.Reynolds(v) < 30000):
-            return 2.0 * np.pi * alpha
-        cl, cd = self.get_polars(v)
-        return cl(alpha)
-
-    def get_cd(self, v, alpha):
-        Ma = self.foil.Mach(v)
-        if Ma > 0.97 or abs(alpha) > np.radians(30) or (self.foil.Reynolds(v) < 30000):
-            return 1.28 * np.sin(alpha)
-
-        cl, cd = self.get_polars(v)
-        return cd(alpha)
-
-    def get_mach(self, velocity):
-        # Round the Mach number to the neares 0.05
-        Ma = np.round(self.foil.Mach(velocity) * 2, 1) / 2
-        return Ma
-
-    def get_reynolds(self, velocity):
-        Re = self.foil.Reynolds(velocity)
-        re_space = np.round(np.geomspace(30000, 2e6, 20), -4)
-        idx = np.argmin(abs(re_space - Re))
-        reynolds = re_space[idx]  # np.round(Re, -4)  # Round to nearest 1000
-
-        if reynolds < 30000.0:
-            reynolds = 30000.0
-
-        return reynolds
-
     def get_from_db(self, velocity, reynolds, Ma):
         sim_id = None
         conn = self.get_db()
@@ -177,9 +462,9 @@ class XfoilSimulatedFoil(PlateSimulatedFoil):
         reynolds = self.get_reynolds(velocity)
         Ma = self.get_mach(velocity)
 
-        re_str = str(reynolds)
-        if re_str in self.polar_poly_cache:
-            return self.polar_poly_cache[re_str]
+        key = (reynolds, Ma)
+        if key in self.polar_poly_cache:
+            return self.polar_poly_cache[key]
 
         # Check if we're in the databse
         sim_id = self.get_from_db(velocity, reynolds, Ma)
@@ -197,9 +482,6 @@ class XfoilSimulatedFoil(PlateSimulatedFoil):
                 cl.append(pol[1])
                 cd.append(pol[2])
             if len(alpha) > 20:
-
-                cl_poly = np.poly1d(np.polyfit(alpha, cl, 9))
-                cd_poly = np.poly1d(np.polyfit(alpha, cd, 9))
                 conn.commit()
                 # conn.close()
 
@@ -215,9 +497,7 @@ class XfoilSimulatedFoil(PlateSimulatedFoil):
                 # plt.title('{}'.format(self.foil))
                 # plt.show()
 
-                self.polar_poly_cache[re_str] = [cl_poly, cd_poly]
-
-                return [cl_poly, cd_poly]
+                return self.store_polar(key, alpha, cl, cd)
             else:
                 logger.info(
                     "Cleaning up simulation with only {} points.".format(len(alpha))
@@ -242,18 +522,10 @@ class XfoilSimulatedFoil(PlateSimulatedFoil):
         n_points = 42
         logger.info("N Points = %d" % n_points)
 
-        pl, pu = self.foil.get_shape_points(n=n_points)
-        """ This contains only the X,Y coordinates, which run from the 
-            trailing edge, round the leading edge, back to the trailing edge 
-            in either direction:
-        """
-        xcoords = np.concatenate((pl[0][::-1], pu[0]), axis=0)
-        ycoords = np.concatenate((pl[1][::-1], pu[1]), axis=0)
+        if xf is None:
+            raise ImportError("xfoil is required to simulate {}".format(self.foil))
 
-        # Chop off overhang.
-        limit = xcoords <= xcoords[0]
-        xcoords = xcoords[limit]
-        ycoords = ycoords[limit]
+        xcoords, ycoords = foil_coordinates(self.foil, n_points)
         if False:
             xcoords = np.append(xcoords, xcoords[0])
             ycoords = np.append(ycoords, ycoords[0])
@@ -285,7 +557,7 @@ class XfoilSimulatedFoil(PlateSimulatedFoil):
             # Try modifying things.
             alpha = np.arange(np.linspace(-20, 20, 0.5))
             cl = 2.0 * np.pi * alpha
-            cd = 1.28 * np.sin(alpha)
+            cd = 1.28 * np.abs(np.sin(alpha)) + 0.02
             cl_poly = np.poly1d(np.polyfit(alpha, cl, 4))
             cd_poly = np.poly1d(np.polyfit(alpha, cd, 4))
             return [cl_poly, cd_poly]
@@ -311,6 +583,199 @@ class XfoilSimulatedFoil(PlateSimulatedFoil):
             conn.commit()
 
 
+class PanelSimulatedFoil(CachedSimulatedFoil):
+    """ Polars from the linear vorticity panel method with an integral
+        boundary layer. There is no database: a polar costs a fraction of
+        a second, and is shared in process through the polar_registry.
+        The factorised panel matrix is kept with the polars, so every
+        Reynolds number bucket of a section reuses it.
+    """
+
+    source = "panel"
+    n_points = 60
+
+    def get_solver(self):
+        if self.polars.solver is None:
+            x, y = foil_coordinates(self.foil, self.n_points)
+            x0 = np.min(x)
+            scale = np.max(x) - x0
+            self.polars.solver = PanelSolver((x - x0) / scale, y / scale)
+            polar_registry.resize(self.cache_key)
+        return self.polars.solver
+
+    def get_polars(self, velocity):
+        key = self.polar_key(velocity)
+        if key in self.polar_poly_cache:
+            return self.polar_poly_cache[key]
+
+        reynolds, Ma = key
+        logger.info(
+            "Panel method {}, at Re={} Ma={:5.2f}".format(self.foil, reynolds, Ma)
+        )
+        alpha = np.radians(np.arange(-20, 20.5, 0.5))
+        cl, cd, cm = self.get_solver().polar(alpha, reynolds, Ma)
+
+        attached = ~np.isnan(cd)
+        if np.count_nonzero(attached) <= 20:
+            logger.warning(
+                "Panel method {}: only {} attached points at Re={}".format(
+                    self.foil, np.count_nonzero(attached), reynolds
+                )
+            )
+            attached = np.abs(alpha) <= np.radians(10)
+            cl = 2.0 * np.pi * alpha
+            cd = 1.28 * np.abs(np.sin(alpha)) + 0.02
+        return self.store_polar(key, alpha[attached], cl[attached], cd[attached])
+
+
+class SurrogateSimulatedFoil(CachedSimulatedFoil):
+    """ Polars from the regression surrogate fitted to the xfoil database.
+
+        The surrogate's uncertainty (ensemble spread of cl) is checked over
+        the working range of angle of attack. Where it exceeds
+        max_uncertainty, or the foil family has no surrogate, the polar comes
+        from xfoil instead (which reads or extends the database).
+    """
+
+    source = "surrogate"
+    max_uncertainty = 0.05
+    working_alpha = np.radians(10.0)
+
+    def __init__(self, foil):
+        CachedSimulatedFoil.__init__(self, foil)
+        self.xfoil = None
+
+    def get_uncertainty(self, velocity):
+        """ Largest cl standard deviation of the polar in the working range """
+        key = self.polar_key(velocity)
+        if key not in self.polars.uncertainty:
+            self.get_polars(velocity)
+        return self.polars.uncertainty[key]
+
+    def get_polars(self, velocity):
+        key = self.polar_key(velocity)
+        if key in self.polar_poly_cache:
+            return self.polar_poly_cache[key]
+
+        reynolds, Ma = key
+        alpha = np.radians(np.arange(-20, 20.5, 0.5))
+        conn = XfoilSimulatedFoil.get_db()
+        prediction = polar_surrogate.predict_polar(conn, self.hash, reynolds, Ma, alpha)
+        if prediction is not None:
+            cl, cd, cm, sigma = prediction
+            uncertainty = np.max(sigma[np.abs(alpha) <= self.working_alpha])
+            if uncertainty <= self.max_uncertainty:
+                self.polars.uncertainty[key] = uncertainty
+                return self.store_polar(key, alpha, cl, cd)
+            logger.info(
+                "Surrogate uncertain for {} at Re={} (sigma={:5.3f}), using xfoil".format(
+                    self.foil, reynolds, uncertainty
+                )
+            )
+
+        if self.xfoil is None:
+            self.xfoil = XfoilSimulatedFoil(self.foil)
+        polar = self.xfoil.get_polars(velocity)
+        self.polar_poly_cache[key] = polar
+        self.polar_metrics[key] = self.xfoil.get_polar_metrics(velocity)
+        self.polars.uncertainty[key] = 0.0
+        polar_registry.resize(self.cache_key)
+        return polar
+
+
+class TieredSimulatedFoil(SimulatedFoil):
+    """ Multi-fidelity simulator: plate, then panel method, then xfoil.
+
+        The simulator answers from its current level. A new simulator starts
+        at the highest available level, so code that knows nothing about
+        tiers gets the full viscous polars. An optimizer can set_level(0)
+        first and escalate() once it has converged, so xfoil only sees the
+        Reynolds buckets of the converged design.
+
+        Each tier's simulator is only built when it first answers a call.
+        Calls answered by each tier are counted in TieredSimulatedFoil.calls.
+        With TieredSimulatedFoil.surrogate set, the top tier answers from the
+        polar surrogate, which falls back to xfoil where it is uncertain.
+    """
+
+    TIERS = ["plate", "panel", "xfoil"]
+    calls = {"plate": 0, "panel": 0, "xfoil": 0}
+    surrogate = False
+
+    def __init__(self, foil):
+        SimulatedFoil.__init__(self, foil)
+        self.simulators = [None, None, None]
+        self.set_level(self.top_level())
+
+    @staticmethod
+    def top_level():
+        """ xfoil is only available if the binding is installed """
+        if xf is None:
+            return 1
+        return 2
+
+    def set_level(self, level):
+        """ Answer from level on, its simulator built on first use """
+        self.level = min(max(level, 0), self.top_level())
+        self.tier = TieredSimulatedFoil.TIERS[self.level]
+
+    def simulator(self, level=None):
+        """ The simulator of level (by default the current one) """
+        if level is None:
+            level = self.level
+        fs = self.simulators[level]
+        if fs is None:
+            top = SurrogateSimulatedFoil if TieredSimulatedFoil.surrogate else XfoilSimulatedFoil
+            tiers = [PlateTierSimulatedFoil, PanelSimulatedFoil, top]
+            fs = tiers[level](self.foil)
+            self.simulators[level] = fs
+        return fs
+
+    def escalate(self):
+        """ Move to the next tier. Returns False if already at the top. """
+        if self.level >= self.top_level():
+            return False
+        self.set_level(self.level + 1)
+        return True
+
+    def agrees(self, level, v, alpha, tolerance):
+        """ True if level gives cl and cd at (v, alpha) within the relative
+            tolerance of the current level, so a design converged on one
+            needs no re-optimisation on the other.
+        """
+        ours = self.simulator()
+        theirs = self.simulator(level)
+        for tier in (self.tier, TieredSimulatedFoil.TIERS[level]):
+            TieredSimulatedFoil.calls[tier] += 2
+        for a, b in (
+            (ours.get_cl(v, alpha), theirs.get_cl(v, alpha)),
+            (ours.get_cd(v, alpha), theirs.get_cd(v, alpha)),
+        ):
+            if abs(a - b) > tolerance * abs(a):
+                return False
+        return True
+
+    def get_cl(self, v, alpha):
+        TieredSimulatedFoil.calls[self.tier] += 1
+        return self.simulator().get_cl(v, alpha)
+
+    def get_cd(self, v, alpha):
+        TieredSimulatedFoil.calls[self.tier] += 1
+        return self.simulator().get_cd(v, alpha)
+
+    def get_zero_cl_angle(self, v):
+        return self.simulator().get_zero_cl_angle(v)
+
+    def get_polar_metrics(self, v):
+        return self.simulator().get_polar_metrics(v)
+
+    @staticmethod
+    def report():
+        return "Polar calls per tier: " + ", ".join(
+            "{}={}".format(t, TieredSimulatedFoil.calls[t])
+            for t in TieredSimulatedFoil.TIERS
+        )
+
 
 if __name__ == "__main__":
     import sys
@@ -0,0 +1,92 @@
+"""
+    Lofted blade surface
+
+    The BEM design gives a section at each of a few radial stations. The
+    loft fits smooth splines through the station chords, twists and unit
+    chord section shapes (so the thickness and camber distributions too),
+    and samples the blade surface at radii of its own choosing: densely
+    where the surface bends along the span, sparsely where it does not.
+    The exported blade no longer needs one BEM station per STL row.
+"""
+import numpy as np
+from scipy.interpolate import CubicSpline, make_smoothing_spline
+
+import logging
+
+from proply.blade_element import section_grid
+from proply.foil import section_shapes
+
+logger = logging.getLogger(__name__)
+
+
+class BladeLoft:
+    """Splines of a prop's blade elements along the radius.
+
+    smoothing (None for interpolating splines) is the make_smoothing_spline
+    penalty applied to the chord and twist, for raw BEM solutions.
+    """
+
+    def __init__(self, prop, smoothing=None):
+        self.prop = prop
+        elements = sorted(prop.blade_elements, key=lambda be: be.r)
+        self.elements = elements
+        self.r = np.array([be.r for be in elements])
+        chord = np.array([be.foil.chord for be in elements])
+        twist = np.array([be.get_twist() for be in elements])
+        if smoothing is None:
+            self.chord = CubicSpline(self.r, chord)
+            self.twist = CubicSpline(self.r, twist)
+        else:
+            self.chord = make_smoothing_spline(self.r, chord, lam=smoothing)
+            self.twist = make_smoothing_spline(self.r, twist, lam=smoothing)
+        self.shapes = {}
+
+    def shape_spline(self, n):
+        """ Spline of the unit chord shapes (stations, 2, 2, n) in r """
+        spline = self.shapes.get(n)
+        if spline is None:
+            foils = [be.foil for be in self.elements]
+            chord = np.array([f.chord for f in foils])
+            shapes = section_shapes(foils, n) / chord[:, None, None, None]
+            spline = CubicSpline(self.r, shapes, axis=0)
+            self.shapes[n] = spline
+        return spline
+
+    def surface_grid(self, r, n):
+        """ Blade surface (len(r), 2, n, 3) at the radii r, as Prop.surface_grid """
+        r = np.asarray(r, dtype=float)
+        shapes = self.shape_spline(n)(r) * self.chord(r)[:, None, None, None]
+        return section_grid(shapes, self.twist(r), r, self.prop.get_scimitar_offset(r))
+
+    def span_samples(self, n, tolerance, candidates=400, min_stations=None):
+        """Radii, hub first, spaced so that the straight rows of the mesh
+        stay within tolerance (m) of the lofted surface.
+
+        The spanwise curvature of every surface point is estimated on a
+        fine set of candidate radii. Rows a distance h apart deviate by
+        about curvature * h^2 / 8 between them, which gives the allowed
+        spacing at each radius.
+        """
+        if min_stations is None:
+            min_stations = len(self.r)
+        r = np.linspace(self.r[0], self.r[-1], candidates)
+        grid = self.surface_grid(r, n)
+        dr = r[1] - r[0]
+        d2 = np.linalg.norm(grid[2:] - 2 * grid[1:-1] + grid[:-2], axis=-1) / dr ** 2
+        curvature = np.max(d2.reshape(len(d2), -1), axis=1)
+        curvature = np.concatenate(([curvature[0]], curvature, [curvature[-1]]))
+
+        density = np.sqrt(np.maximum(curvature, 1e-12) / (8.0 * tolerance))
+        cumulative = np.concatenate(
+            ([0.0], np.cumsum(0.5 * (density[1:] + density[:-1]) * dr))
+        )
+        stations = max(int(np.ceil(cumulative[-1])) + 1, min_stations)
+        samples = np.interp(np.linspace(0, cumulative[-1], stations), cumulative, r)
+        logger.info(
+            "Loft: {} stations for tolerance {:4.3f} mm".format(stations, tolerance * 1000)
+        )
+        return samples
+
+    def grid(self, n, tolerance):
+        """ Adaptively sampled blade surface, hub first like the blade elements """
+        return self.surface_grid(self.span_samples(n, tolerance), n)
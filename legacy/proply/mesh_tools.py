@@ -0,0 +1,555 @@
+"""
+    Indexed triangle meshes
+
+    The blade surface grid is closed into a watertight solid with shared
+    vertices: each station becomes a ring round the section, neighbouring
+    rings are joined, and the tip and root rings are capped. Faces are
+    wound consistently, outward, so the result needs no mesh cleaning
+    before slicing, and is written directly as PLY, OBJ, 3MF or STL.
+"""
+import io
+import zipfile
+
+import numpy as np
+
+import logging
+
+from proply.stl_tools import StlWriter
+
+logger = logging.getLogger(__name__)
+
+
+class IndexedMesh:
+    """vertices (V, 3) and faces (F, 3) of vertex indices. A blade built
+    from its sections also keeps rings, the vertex indices of each
+    section ring.
+    """
+
+    def __init__(self, vertices, faces, rings=None):
+        self.vertices = np.asarray(vertices, dtype=float)
+        self.faces = np.asarray(faces, dtype=np.int64)
+        self.rings = rings
+
+    @staticmethod
+    def section_ring(n, closed_te):
+        """Ring indices of the lower and upper surface points of a section.
+
+        The ring runs from the lower trailing edge round the leading edge
+        (shared by both surfaces) to the upper trailing edge, which is the
+        lower one again when the trailing edge is closed.
+        """
+        lower = n - 1 - np.arange(n)
+        upper = n - 1 + np.arange(n)
+        m = 2 * n - 1
+        if closed_te:
+            upper[-1] = 0
+            m -= 1
+        return lower, upper, m
+
+    @staticmethod
+    def from_blade_grid(grid, tolerance=1e-9, caps=(True, True)):
+        """A closed solid from a (stations, 2, n, 3) surface grid.
+
+        caps says whether to cap the first and the last station. Station k
+        is the ring of vertices [k * m, (k + 1) * m), m = len(vertices) / stations.
+        """
+        grid = np.asarray(grid, dtype=float)
+        stations, _, n, _ = grid.shape
+        closed_te = np.all(
+            np.linalg.norm(grid[:, 0, -1] - grid[:, 1, -1], axis=-1) < tolerance
+        )
+        lower, upper, m = IndexedMesh.section_ring(n, closed_te)
+
+        ring = np.empty((stations, m, 3))
+        ring[:, lower] = grid[:, 0]
+        ring[:, upper] = grid[:, 1]
+
+        # Quads between neighbouring rings, the ring closing round the trailing edge
+        k, j = np.meshgrid(np.arange(stations - 1), np.arange(m), indexing="ij")
+        a = k * m + j
+        b = k * m + (j + 1) % m
+        c = (k + 1) * m + (j + 1) % m
+        d = (k + 1) * m + j
+        tube = np.concatenate(
+            (np.stack([a, b, c], axis=-1), np.stack([a, c, d], axis=-1))
+        ).reshape(-1, 3)
+
+        # Caps join the lower and upper surfaces chordwise
+        i = np.arange(n - 1)
+        cap = np.concatenate(
+            (
+                np.stack([lower[i], lower[i + 1], upper[i + 1]], axis=1),
+                np.stack([lower[i], upper[i + 1], upper[i]], axis=1),
+            )
+        )
+        distinct = (cap[:, 0] != cap[:, 1]) & (cap[:, 1] != cap[:, 2]) & (cap[:, 0] != cap[:, 2])
+        cap = cap[distinct]
+
+        tube_edges = IndexedMesh.directed_edges(tube)
+        cap_faces = []
+        for offset, wanted in zip((0, (stations - 1) * m), caps):
+            if not wanted:
+                continue
+            f = cap + offset
+            if np.any(np.isin(IndexedMesh.directed_edges(f), tube_edges)):
+                f = f[:, ::-1]
+            cap_faces.append(f)
+
+        rings = [k * m + np.arange(m) for k in range(stations)]
+        mesh = IndexedMesh(ring.reshape(-1, 3), np.concatenate([tube] + cap_faces), rings)
+        if mesh.volume() < 0:
+            mesh.faces = mesh.faces[:, ::-1]
+        return mesh
+
+    @staticmethod
+    def from_sections(sections, tolerance=1e-9, caps=(True, True)):
+        """A closed solid from a list of (2, n_k, 3) sections, whose point
+        counts may differ from station to station.
+
+        Neighbouring rings are joined by walking round both together in
+        order of the arc length fraction along each surface, so leading
+        edge joins leading edge and trailing edge joins trailing edge.
+        """
+        sections = [np.asarray(section, dtype=float) for section in sections]
+        closed_te = all(
+            np.linalg.norm(section[0, -1] - section[1, -1]) < tolerance for section in sections
+        )
+
+        vertices = []
+        rings = []
+        chains = []
+        cap_chains = []
+        offset = 0
+        for section in sections:
+            n = section.shape[1]
+            lower, upper, m = IndexedMesh.section_ring(n, closed_te)
+            ring = np.empty((m, 3))
+            ring[lower] = section[0]
+            ring[upper] = section[1]
+            fl = arc_fraction(section[0])
+            fu = arc_fraction(section[1])
+
+            # Round the ring from the lower to the upper trailing edge
+            t = np.concatenate((-fl[::-1], fu[1:]))
+            chain = np.append(np.arange(m), 0) if closed_te else np.arange(m)
+            vertices.append(ring)
+            rings.append(offset + np.arange(m))
+            chains.append((offset + chain, t))
+            cap_chains.append((offset + lower, fl, offset + upper, fu))
+            offset += m
+
+        tube = []
+        for (ia, ta), (ib, tb) in zip(chains[:-1], chains[1:]):
+            tube.append(merge_chains(ia, ta, ib, tb))
+            if not closed_te:
+                tube.append([(ia[-1], ia[0], ib[-1]), (ia[0], ib[0], ib[-1])])
+        tube = np.concatenate(tube)
+
+        tube_edges = IndexedMesh.directed_edges(tube)
+        cap_faces = []
+        for k, wanted in zip((0, -1), caps):
+            if not wanted:
+                continue
+            f = merge_chains(*cap_chains[k])
+            f = f[(f[:, 0] != f[:, 1]) & (f[:, 1] != f[:, 2]) & (f[:, 0] != f[:, 2])]
+            if np.any(np.isin(IndexedMesh.directed_edges(f), tube_edges)):
+                f = f[:, ::-1]
+            cap_faces.append(f)
+
+        mesh = IndexedMesh(np.concatenate(vertices), np.concatenate([tube] + cap_faces), rings)
+        if mesh.volume() < 0:
+            mesh.faces = mesh.faces[:, ::-1]
+        return mesh
+
+    @staticmethod
+    def directed_edges(faces):
+        """ Each directed edge as a single integer key """
+        e0 = faces.ravel()
+        e1 = np.roll(faces, -1, axis=1).ravel()
+        return e0 * (2 ** 32) + e1
+
+    def volume(self):
+        v = self.vertices[self.faces]
+        return np.sum(v[:, 0] * np.cross(v[:, 1], v[:, 2])) / 6.0
+
+    def is_watertight(self):
+        """Every directed edge appears once and its reverse once, so each
+        edge has two faces wound in opposite directions.
+        """
+        edges = self.directed_edges(self.faces)
+        if len(np.unique(edges)) != len(edges):
+            return False
+        reverse = self.directed_edges(self.faces[:, ::-1])
+        return np.all(np.isin(edges, reverse))
+
+    def transformed(self, matrix):
+        """ A copy with vertices @ matrix.T, still wound outward """
+        matrix = np.asarray(matrix, dtype=float)
+        faces = self.faces if np.linalg.det(matrix) > 0 else self.faces[:, ::-1]
+        return IndexedMesh(self.vertices @ matrix.T, faces)
+
+    @staticmethod
+    def concatenate(meshes):
+        offsets = np.cumsum([0] + [len(m.vertices) for m in meshes[:-1]])
+        return IndexedMesh(
+            np.concatenate([m.vertices for m in meshes]),
+            np.concatenate([m.faces + o for m, o in zip(meshes, offsets)]),
+        )
+
+    def save(self, filename):
+        """ Write by the file extension: .ply, .obj, .3mf or .stl """
+        ext = filename.rsplit(".", 1)[-1].lower()
+        writers = {
+            "ply": self.write_ply,
+            "obj": self.write_obj,
+            "3mf": self.write_3mf,
+            "stl": self.write_stl,
+        }
+        if ext not in writers:
+            raise ValueError("Unknown mesh format {}".format(ext))
+        writers[ext](filename)
+
+    def write_ply(self, filename):
+        """ Binary little endian PLY """
+        header = (
+            "ply\n"
+            "format binary_little_endian 1.0\n"
+            "comment proply\n"
+            "element vertex {}\n"
+            "property float x\nproperty float y\nproperty float z\n"
+            "element face {}\n"
+            "property list uchar int vertex_indices\n"
+            "end_header\n"
+        ).format(len(self.vertices), len(self.faces))
+        face_dtype = np.dtype([("count", "u1"), ("index", "<i4", (3,))])
+        faces = np.empty(len(self.faces), dtype=face_dtype)
+        faces["count"] = 3
+        faces["index"] = self.faces
+        with open(filename, "wb") as f:
+            f.write(header.encode("ascii"))
+            f.write(self.vertices.astype("<f4").tobytes())
+            f.write(faces.tobytes())
+
+    def write_obj(self, filename):
+        with open(filename, "w") as f:
+            f.write("# proply\n")
+            np.savetxt(f, self.vertices, fmt="v %.6f %.6f %.6f")
+            np.savetxt(f, self.faces + 1, fmt="f %d %d %d")
+
+    def write_3mf(self, filename):
+        """ 3MF core specification package, units mm """
+        model = io.StringIO()
+        model.write(
+            '<?xml version="1.0" encoding="UTF-8"?>\n'
+            '<model unit="millimeter" xml:lang="en-US" '
+            'xmlns="http://schemas.microsoft.com/3dmanufacturing/core/2015/02">\n'
+            '<resources><object id="1" type="model"><mesh><vertices>\n'
+        )
+        np.savetxt(model, self.vertices, fmt='<vertex x="%.6f" y="%.6f" z="%.6f"/>')
+        model.write("</vertices><triangles>\n")
+        np.savetxt(model, self.faces, fmt='<triangle v1="%d" v2="%d" v3="%d"/>')
+        model.write(
+            "</triangles></mesh></object></resources>\n"
+            '<build><item objectid="1"/></build>\n</model>\n'
+        )
+        content_types = (
+            '<?xml version="1.0" encoding="UTF-8"?>\n'
+            '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+            '<Default Extension="rels" '
+            'ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+            '<Default Extension="model" '
+            'ContentType="application/vnd.ms-package.3dmanufacturing-3dmodel+xml"/>'
+            "</Types>\n"
+        )
+        rels = (
+            '<?xml version="1.0" encoding="UTF-8"?>\n'
+            '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+            '<Relationship Target="/3D/3dmodel.model" Id="rel0" '
+            'Type="http://schemas.microsoft.com/3dmanufacturing/2013/01/3dmodel"/>'
+            "</Relationships>\n"
+        )
+        with zipfile.ZipFile(filename, "w", zipfile.ZIP_DEFLATED) as z:
+            z.writestr("[Content_Types].xml", content_types)
+            z.writestr("_rels/.rels", rels)
+            z.writestr("3D/3dmodel.model", model.getvalue())
+
+    def write_stl(self, filename):
+        with StlWriter(filename, len(self.faces)) as writer:
+            for start in range(0, len(self.faces), writer.chunk):
+                writer.write(self.vertices[self.faces[start : start + writer.chunk]])
+
+
+def rotation_z(angle):
+    c = np.cos(angle)
+    s = np.sin(angle)
+    return np.array([[c, -s, 0.0], [s, c, 0.0], [0.0, 0.0, 1.0]])
+
+
+def arc_fraction(points):
+    """ Arc length along the (n, 3) points, from 0 at the first to 1 at the last """
+    d = np.linalg.norm(np.diff(points, axis=0), axis=1)
+    s = np.concatenate(([0.0], np.cumsum(d)))
+    return s / s[-1]
+
+
+def merge_chains(ia, ta, ib, tb):
+    """Triangles between two chains of vertex indices ia and ib, walked
+    together in order of their increasing parameters ta and tb.
+    """
+    na = len(ia) - 1
+    nb = len(ib) - 1
+    triangles = []
+    i = 0
+    j = 0
+    while i < na or j < nb:
+        if j == nb or (i < na and ta[i + 1] <= tb[j + 1]):
+            triangles.append((ia[i], ia[i + 1], ib[j]))
+            i += 1
+        else:
+            triangles.append((ia[i], ib[j + 1], ib[j]))
+            j += 1
+    return np.array(triangles, dtype=np.int64)
+
+
+def chordal_density(curve, tolerance):
+    """Arc length s along a densely sampled (N, 3) curve, and the number
+    of straight segments needed up to each point to stay within tolerance
+    of the curve. A segment of length h where the curvature is k is about
+    k h^2 / 8 from the curve.
+    """
+    d = np.linalg.norm(np.diff(curve, axis=0), axis=1)
+    s = np.concatenate(([0.0], np.cumsum(d)))
+    a = curve[1:-1] - curve[:-2]
+    b = curve[2:] - curve[1:-1]
+    c = curve[2:] - curve[:-2]
+    lengths = np.linalg.norm(a, axis=1) * np.linalg.norm(b, axis=1) * np.linalg.norm(c, axis=1)
+    k = 2.0 * np.linalg.norm(np.cross(a, b), axis=1) / np.maximum(lengths, 1e-300)
+    k = np.concatenate(([k[0]], k, [k[-1]]))
+    density = np.sqrt(k / (8.0 * tolerance))
+    return s, np.concatenate(([0.0], np.cumsum(0.5 * (density[1:] + density[:-1]) * d)))
+
+
+def adaptive_sections(grid, tolerance, n_min=4):
+    """Resample each station of a densely sampled (stations, 2, N, 3) grid
+    to as few chordwise points as keep it within tolerance of the surface,
+    spaced closer where the section bends. The lower and upper surfaces of
+    a station get the same count, so they share a section ring. Returns a
+    list of (2, n_k, 3) sections for IndexedMesh.from_sections.
+    """
+    grid = np.asarray(grid, dtype=float)
+    sections = []
+    capped = []
+    for station in grid:
+        fits = [chordal_density(curve, tolerance) for curve in station]
+        n = max([n_min] + [int(np.ceil(cumulative[-1])) + 1 for s, cumulative in fits])
+        if n > grid.shape[2]:
+            capped.append(n)
+            n = grid.shape[2]
+        section = np.empty((2, n, 3))
+        for k, (s, cumulative) in enumerate(fits):
+            target = np.interp(np.linspace(0, cumulative[-1], n), cumulative, s)
+            for axis in range(3):
+                section[k, :, axis] = np.interp(target, s, station[k, :, axis])
+        sections.append(section)
+    if capped:
+        logger.warning(
+            "{} sections need up to {} points for a tolerance of {:g} but have only {}: "
+            "sample them more densely".format(len(capped), max(capped), tolerance, grid.shape[2])
+        )
+    return sections
+
+
+def resample_grid(grid, stations, n):
+    """A coarser blade grid, about (stations, 2, n, 3), picked from the rows
+    and columns of a structured one. The points stay on the fine surface
+    and keep its spacing, and the tip, root, leading and trailing edges
+    are always kept.
+    """
+    grid = np.asarray(grid)
+    rows = np.unique(np.round(np.linspace(0, len(grid) - 1, max(2, stations))).astype(int))
+    cols = np.unique(np.round(np.linspace(0, grid.shape[2] - 1, max(3, n))).astype(int))
+    return grid[rows][:, :, cols]
+
+
+def lod_grids(grid, factors):
+    """ resample_grid with 1/factor of the rows and of the columns, for each factor """
+    grid = np.asarray(grid)
+    stations, _, n, _ = grid.shape
+    return [resample_grid(grid, -(-stations // k), -(-n // k)) for k in factors]
+
+
+def blade_solid(surface, caps=(True, True)):
+    """ A closed blade from a (stations, 2, n, 3) grid or a list of sections """
+    if isinstance(surface, np.ndarray):
+        return IndexedMesh.from_blade_grid(surface, caps=caps)
+    return IndexedMesh.from_sections(surface, caps=caps)
+
+
+def zipper(inner, outer):
+    """Triangles filling the band between two closed loops of 2D points,
+    both counter clockwise and star shaped about the origin. The loops
+    are walked together in order of angle. Returns (k, 3) indices with
+    the inner points numbered first.
+    """
+
+    def walk(points, offset):
+        angle = np.arctan2(points[:, 1], points[:, 0])
+        order = np.roll(np.arange(len(points)), -np.argmin(angle))
+        angle = np.unwrap(angle[order])
+        return (
+            np.append(order, order[0]) + offset,
+            np.append(angle, angle[0] + 2.0 * np.pi),
+        )
+
+    ia, aa = walk(inner, 0)
+    ib, ab = walk(outer, len(inner))
+    return merge_chains(ia, aa, ib, ab)
+
+
+def hub_extent(root, hub_height):
+    """Radius and height range (r, z0, z1) of a hub for the blade root
+    section points root: at the root radius, centred on the root and at
+    least hub_height tall, with a margin above and below the root.
+    """
+    r = np.mean(np.hypot(root[:, 0], root[:, 1]))
+    z = root[:, 2]
+    margin = 0.1 * (np.max(z) - np.min(z))
+    zc = (np.max(z) + np.min(z)) / 2
+    z0 = min(zc - hub_height / 2, np.min(z) - margin)
+    z1 = max(zc + hub_height / 2, np.max(z) + margin)
+    return r, z0, z1
+
+
+def prop_mesh(
+    grid, n_blades, hub_height, center_hole, segments=96, side_points=4, ccw=False
+):
+    """The whole propeller as one watertight mesh.
+
+    grid is one blade surface, (stations, 2, n, 3) or a list of (2, n_k, 3)
+    sections as from adaptive_sections. The blades are copies
+    rotated about z. The hub is a cylinder at the blade root radius,
+    hub_height tall (or taller, to hold the root section) and centred on
+    the root, with a bore of diameter center_hole. Each sector of the hub
+    wall is triangulated between its edges and the blade root section, so
+    the root is stitched into the hub instead of overlapping it.
+    """
+    if n_blades < 2:
+        raise ValueError("The hub is built from one sector per blade, need two or more")
+    if np.mean(np.hypot(grid[0][..., 0], grid[0][..., 1])) < np.mean(
+        np.hypot(grid[-1][..., 0], grid[-1][..., 1])
+    ):
+        grid = grid[::-1]  # Root last
+    blade = blade_solid(grid, caps=(True, False))
+    root = blade.rings[-1]
+    m = len(root)
+    root_xyz = blade.vertices[root]
+
+    r_hub, z0, z1 = hub_extent(root_xyz, hub_height)
+    theta_root = np.arctan2(root_xyz[:, 1], root_xyz[:, 0])
+    theta0 = np.angle(np.mean(np.exp(1j * theta_root)))
+    half = np.pi / n_blades
+    z_root = root_xyz[:, 2]
+
+    # Hub vertices: outer top and bottom rings, the sector edges, the bore
+    q = max(4, segments // n_blades)
+    T = n_blades * q
+    theta = theta0 - half + 2.0 * np.pi * np.arange(T) / T
+    zs = np.linspace(z0, z1, side_points + 2)[1:-1]
+    phi = theta[::q]
+    r_hole = center_hole / 2.0
+
+    def circle(r, z, angles):
+        return np.stack(
+            [r * np.cos(angles), r * np.sin(angles), np.full(len(angles), z)], axis=1
+        )
+
+    hub_vertices = [
+        circle(r_hub, z1, theta),
+        circle(r_hub, z0, theta),
+        np.array([circle(r_hub, z, phi) for z in zs]).transpose(1, 0, 2).reshape(-1, 3),
+    ]
+    if r_hole > 0:
+        hub_vertices += [circle(r_hole, z1, theta), circle(r_hole, z0, theta)]
+    else:
+        hub_vertices += [np.array([[0.0, 0.0, z1], [0.0, 0.0, z0]])]
+    hub_vertices = np.concatenate(hub_vertices)
+
+    nv = len(blade.vertices)
+    h0 = n_blades * nv
+    o_top = h0 + np.arange(T)
+    o_bot = h0 + T + np.arange(T)
+    side = (h0 + 2 * T + np.arange(n_blades * side_points)).reshape(n_blades, side_points)
+    bore = h0 + 2 * T + n_blades * side_points
+
+    # The root section in the local (u, z) coordinates of its sector
+    du = np.angle(np.exp(1j * (theta_root - theta0)))
+    ring = np.stack([r_hub * du, z_root], axis=1)
+    order = np.arange(m)
+    area = np.sum(ring[:, 0] * np.roll(ring[:, 1], -1) - np.roll(ring[:, 0], -1) * ring[:, 1])
+    if area < 0:
+        order = order[::-1]
+    if np.max(np.abs(ring[:, 0])) > r_hub * half:
+        logger.warning("Blade root is wider than its hub sector")
+    closed = np.append(ring, ring[:1], axis=0)
+    cross = closed[:-1, 0] * closed[1:, 1] - closed[1:, 0] * closed[:-1, 1]
+    centre = np.sum((closed[:-1] + closed[1:]) * cross[:, None], axis=0) / (3.0 * np.sum(cross))
+
+    u = r_hub * (-half + 2.0 * half * np.arange(q + 1) / q)
+    loop_uz = np.concatenate(
+        [
+            np.stack([u, np.full(q + 1, z0)], axis=1),
+            np.stack([np.full(side_points, r_hub * half), zs], axis=1),
+            np.stack([u[::-1], np.full(q + 1, z1)], axis=1),
+            np.stack([np.full(side_points, -r_hub * half), zs[::-1]], axis=1),
+        ]
+    )
+    band = zipper(ring[order] - centre, loop_uz - centre)
+
+    pieces = []
+    for k in range(n_blades):
+        t = (k * q + np.arange(q + 1)) % T
+        loop = np.concatenate(
+            [o_bot[t], side[(k + 1) % n_blades], o_top[t[::-1]], side[k][::-1]]
+        )
+        index = np.concatenate([k * nv + root[order], loop])
+        pieces.append(index[band])
+
+    # Top, bottom and bore
+    t = np.arange(T)
+    t1 = (t + 1) % T
+
+    def strip(a, b):
+        """ Quads between two rings of T vertices """
+        return np.concatenate(
+            [np.stack([a[t], a[t1], b[t1]], axis=1), np.stack([a[t], b[t1], b[t]], axis=1)]
+        )
+
+    if r_hole > 0:
+        i_top = bore + t
+        i_bot = bore + T + t
+        pieces += [strip(o_top, i_top), strip(o_bot, i_bot), strip(i_top, i_bot)]
+    else:
+        pieces.append(np.stack([o_top[t], o_top[t1], np.full(T, bore)], axis=1))
+        pieces.append(np.stack([o_bot[t], o_bot[t1], np.full(T, bore + 1)], axis=1))
+
+    blades = [
+        blade.transformed(rotation_z(2.0 * np.pi * k / n_blades)) for k in range(n_blades)
+    ]
+    mesh = IndexedMesh.concatenate(blades)
+    mesh.vertices = np.concatenate([mesh.vertices, hub_vertices])
+
+    # Wind each hub piece against the faces it joins
+    faces = [mesh.faces]
+    accepted = IndexedMesh.directed_edges(mesh.faces)
+    for piece in pieces:
+        if np.any(np.isin(IndexedMesh.directed_edges(piece), accepted)):
+            piece = piece[:, ::-1]
+        faces.append(piece)
+        accepted = np.concatenate([accepted, IndexedMesh.directed_edges(piece)])
+    mesh.faces = np.concatenate(faces)
+    if mesh.volume() < 0:
+        mesh.faces = mesh.faces[:, ::-1]
+
+    if ccw:
+        mesh = mesh.transformed(np.diag([-1.0, 1.0, 1.0]))
+    return mesh
@@ -50,13 +50,16 @@ def iterate(foil_simulator, c, dv, a_prime, theta, omega, r, dr, u_0, B):
     return dv_new, a_prime_new
 
 
-def precalc(foil_simulator, dv, a_prime, theta, omega, r, dr, u_0, B):
+def operating_point(dv, a_prime, theta, omega, r, u_0):
+    """ Relative air speed, angle of attack and inflow angle phi at an element """
     u = u_0 + dv
     v = omega * r * (1.0 - a_prime)
     phi = arctan(u / v)
-    alpha = theta - phi
-    # print alpha
-    v_rel = sqrt(u ** 2 + v ** 2)
+    return sqrt(u ** 2 + v ** 2), theta - phi, phi
+
+
+def precalc(foil_simulator, dv, a_prime, theta, omega, r, dr, u_0, B):
+    v_rel, alpha, phi = operating_point(dv, a_prime, theta, omega, r, u_0)
     C_D = foil_simulator.get_cd(v_rel, alpha)
     C_L = foil_simulator.get_cl(v_rel, alpha)
     return C_L, C_D, phi
@@ -430,15 +433,40 @@ def min_dv(x, goal, rpm, r, dr, u_0, B, foil_simulator):
         return 1e6
 
 
+# Bound the twist search by the polar metrics. False restores the fixed
+# [-8, 10] degree window (and a zero lift angle of 0) of earlier designs.
+polar_bounds = True
+
+
+def alpha_bounds(foil_simulator, dv, rpm, r, u_0):
+    """Range of angle of attack for the twist search, from the zero lift
+    angle up to stall (Cl max), limited to [-8, 10] degrees.
+
+    Read from the polar metrics, so costs nothing once the polar is loaded.
+    """
+    if not polar_bounds:
+        return -radians(8), radians(10)
+    u = u_0 + dv
+    v = rpm2omega(rpm) * r
+    metrics = foil_simulator.get_polar_metrics(sqrt(u ** 2 + v ** 2))
+    lower = max(-radians(8), metrics.zero_lift_alpha)
+    upper = min(radians(10), metrics.cl_max_alpha)
+    if upper <= lower:
+        return -radians(8), radians(10)
+    return lower, upper
+
+
 def design_for_dv(foil_simulator, dv_goal, rpm, r, dr, u_0, B):
     C_L, C_D, phi = precalc(
         foil_simulator, dv_goal, 0, 0, (rpm / 60) * 2 * pi, r, dr, u_0, B
     )
     print(C_L, C_D, degrees(phi))
-    x0 = [phi, dv_goal, 0.002]  # theta, dv, a_prime
+    alpha_min, alpha_max = alpha_bounds(foil_simulator, dv_goal, rpm, r, u_0)
+    th_guess = min(max(phi, phi + alpha_min), phi + alpha_max)
+    x0 = [th_guess, dv_goal, 0.002]  # theta, dv, a_prime
     constraints = [
-        {"type": "ineq", "fun": lambda x: x[0] - (phi - radians(8))},
-        {"type": "ineq", "fun": lambda x: (phi + radians(10)) - x[0]},
+        {"type": "ineq", "fun": lambda x: x[0] - (phi + alpha_min)},
+        {"type": "ineq", "fun": lambda x: (phi + alpha_max) - x[0]},
         {"type": "ineq", "fun": lambda x: x[1] - dv_goal / 2},
         {"type": "ineq", "fun": lambda x: 2 * dv_goal - x[1]},
         {"type": "ineq", "fun": lambda x: x[2]},
@@ -457,7 +485,7 @@ def design_for_dv(foil_simulator, dv_goal, rpm, r, dr, u_0, B):
     # method='Nelder-Mead', options={'initial_simplex': initial_simplex_all(x0), \
     #'xatol': 1e-7, 'disp': False, 'maxiter': 10000})
     if res.fun > 0.1:
-        x0 = [phi, dv_goal, 0.02]  # theta, dv, a_prime
+        x0 = [th_guess, dv_goal, 0.02]  # theta, dv, a_prime
         ## Restart optimization around previous best
         res = minimize(
             min_dv,
@@ -496,15 +524,24 @@ def min_all(x, goal, rpm, r, dr, u_0, B, foil_simulator):
         return 1e6
 
 
-def optimize_all(foil_simulator, dv_goal, rpm, r, dr, u_0, B, maxchord):
+def optimize_all(foil_simulator, dv_goal, rpm, r, dr, u_0, B, maxchord, x_guess=None):
+    """x_guess is an optional starting point (theta, dv, a_prime, chord),
+    e.g. the result of a run on a cheaper polar tier.
+    """
     C_L, C_D, phi = precalc(
         foil_simulator, dv_goal, 0, 0, (rpm / 60) * 2 * pi, r, dr, u_0, B
     )
     print(C_L, C_D, degrees(phi), dv_goal)
-    x0 = [phi, dv_goal, 0.002, foil_simulator.foil.chord]  # theta, dv, a_prime
+    alpha_min, alpha_max = alpha_bounds(foil_simulator, dv_goal, rpm, r, u_0)
+    if x_guess is None:
+        th_guess = min(max(phi, phi + alpha_min), phi + alpha_max)
+        x0 = [th_guess, dv_goal, 0.002, foil_simulator.foil.chord]  # theta, dv, a_prime
+    else:
+        th_guess = min(max(x_guess[0], phi + alpha_min), phi + alpha_max)
+        x0 = [th_guess, x_guess[1], x_guess[2], min(x_guess[3], maxchord)]
     constraints = [
-        {"type": "ineq", "fun": lambda x: x[0] - (phi - radians(8))},
-        {"type": "ineq", "fun": lambda x: (phi + radians(10)) - x[0]},
+        {"type": "ineq", "fun": lambda x: x[0] - (phi + alpha_min)},
+        {"type": "ineq", "fun": lambda x: (phi + alpha_max) - x[0]},
         {"type": "ineq", "fun": lambda x: x[1] - dv_goal / 2},
         {"type": "ineq", "fun": lambda x: 2 * dv_goal - x[1]},
         {"type": "ineq", "fun": lambda x: x[2]},
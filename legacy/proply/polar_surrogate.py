@@ -0,0 +1,175 @@
+"""
+    Polar surrogate model trained from the foil_simulator database.
+
+    Every XFOIL polar ever simulated is in foil_simulator.db. The foil hash
+    of the parametric families encodes their shape (NACA4: camber, camber
+    position, thickness, trailing edge; interpolated ARA-D: thickness,
+    trailing edge), so the database is a training set for
+
+        (thickness, camber, camber position, trailing edge, Re, Mach, alpha)
+            -> (cl, cd, cm)
+
+    One surrogate is fitted per family, once per process. Each is a small
+    ensemble of local multiquadric RBF interpolators, every member fitted
+    to a bootstrap sample of the simulations (a simulation drawn k times
+    weighs k times, through a k times smaller smoothing at its points).
+    The ensemble spread in cl is the uncertainty estimate: it grows away
+    from the training data, which is where the SurrogateSimulatedFoil
+    falls back to XFOIL.
+"""
+import numpy as np
+from scipy.interpolate import RBFInterpolator
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def foil_features(foil_hash):
+    """Shape features (thickness, camber, camber position, trailing edge)
+    and the family name, decoded from a foil hash. None for foils whose
+    hash does not describe their shape.
+    """
+    try:
+        if foil_hash.startswith("ARAD_I "):
+            t, te = [float(v) for v in foil_hash[7:].split(",")]
+            return "arad", [t, 0.0, 0.0, te]
+        m, p, t, te = [float(v) for v in foil_hash.split(",")]
+        return "naca4", [t, m, p, te]
+    except ValueError:
+        return None
+
+
+def feature_matrix(shape, reynolds, mach, alpha):
+    """ One row per alpha: (t, m, p, te, log10(Re), Mach, alpha) """
+    alpha = np.atleast_1d(alpha)
+    X = np.empty((len(alpha), 7))
+    X[:, 0:4] = shape
+    X[:, 4] = np.log10(reynolds)
+    X[:, 5] = mach
+    X[:, 6] = alpha
+    return X
+
+
+class PolarSurrogate:
+    """Bootstrap ensemble of RBF interpolators for one foil family"""
+
+    def __init__(self, n_models=5, neighbors=64, smoothing=1e-4, seed=0):
+        self.n_models = n_models
+        self.neighbors = neighbors
+        self.smoothing = smoothing
+        self.rng = np.random.default_rng(seed)
+        self.models = []
+        self.offset = None
+        self.scale = None
+        self.active = None
+
+    def fit(self, X, Y, groups):
+        """X features (N, 7), Y targets (N, 3) of cl, cd, cm. groups labels
+        the simulation each row came from: bootstrap samples are drawn by
+        simulation, so a member never sees part of a polar.
+        """
+        # Features that never vary in the data (e.g. Mach) carry no information
+        self.offset = np.mean(X, axis=0)
+        self.scale = np.std(X, axis=0)
+        self.active = self.scale > 0
+        Xn = ((X - self.offset) / np.where(self.active, self.scale, 1.0))[:, self.active]
+
+        Y = np.array(Y, dtype=float)
+        Y[:, 1] = np.log(np.maximum(Y[:, 1], 1e-5))  # cd stays positive
+
+        sims = np.unique(groups)
+        neighbors = min(self.neighbors, len(X))
+        self.models = []
+        sim_index = np.searchsorted(sims, groups)
+        for i in range(self.n_models):
+            draws = np.bincount(self.rng.integers(len(sims), size=len(sims)), minlength=len(sims))
+            weight = draws[sim_index]
+            rows = weight > 0
+            # Repeated rows would make the interpolation singular, so each
+            # distinct point is kept once with the weight of all its draws
+            Xs, index, inverse = np.unique(
+                Xn[rows], axis=0, return_index=True, return_inverse=True
+            )
+            weight = np.bincount(inverse.ravel(), weights=weight[rows])
+            self.models.append(
+                RBFInterpolator(
+                    Xs,
+                    Y[rows][index],
+                    neighbors=min(neighbors, len(Xs)),
+                    smoothing=self.smoothing / weight,
+                    kernel="multiquadric",
+                    epsilon=1.0,
+                    degree=0,
+                )
+            )
+        return self
+
+    def predict(self, X):
+        """ Return cl, cd, cm and the ensemble standard deviation of cl """
+        X = np.atleast_2d(X)
+        Xn = ((X - self.offset) / np.where(self.active, self.scale, 1.0))[:, self.active]
+        Y = np.array([m(Xn) for m in self.models])
+        mean = np.mean(Y, axis=0)
+        sigma = np.std(Y[:, :, 0], axis=0)
+        return mean[:, 0], np.exp(mean[:, 1]), mean[:, 2], sigma
+
+
+g_surrogates = None
+
+
+def load_surrogates(conn, min_simulations=5):
+    """Fit one PolarSurrogate per foil family from the polar database.
+    The database is read once per process: later calls, from any
+    simulator, return the same surrogates.
+    """
+    global g_surrogates
+    if g_surrogates is not None:
+        return g_surrogates
+
+    rows = conn.execute(
+        "SELECT f.hash, s.id, s.reynolds, s.mach, p.alpha, p.cl, p.cd, p.cm "
+        "FROM polar p JOIN simulation s ON p.sim_id = s.id "
+        "JOIN foil f ON s.foil_id = f.id"
+    ).fetchall()
+
+    data = {}
+    for foil_hash, sim_id, reynolds, mach, alpha, cl, cd, cm in rows:
+        decoded = foil_features(foil_hash)
+        if decoded is None or None in (cl, cd, cm):
+            continue
+        family, shape = decoded
+        X, Y, groups = data.setdefault(family, ([], [], []))
+        X.append(shape + [np.log10(reynolds), mach, alpha])
+        Y.append([cl, cd, cm])
+        groups.append(sim_id)
+
+    surrogates = {}
+    for family, (X, Y, groups) in data.items():
+        groups = np.array(groups)
+        n_sims = len(np.unique(groups))
+        if n_sims < min_simulations:
+            logger.info("Surrogate {}: only {} simulations".format(family, n_sims))
+            continue
+        logger.info(
+            "Fitting {} surrogate on {} points from {} simulations".format(
+                family, len(X), n_sims
+            )
+        )
+        surrogates[family] = PolarSurrogate().fit(np.array(X), np.array(Y), groups)
+    g_surrogates = surrogates
+    return g_surrogates
+
+
+def predict_polar(conn, foil_hash, reynolds, mach, alpha):
+    """Surrogate polar (cl, cd, cm, sigma) for this foil, or None if there
+    is no surrogate for its family.
+    """
+    decoded = foil_features(foil_hash)
+    if decoded is None:
+        return None
+    family, shape = decoded
+    surrogate = load_surrogates(conn).get(family)
+    if surrogate is None:
+        return None
+    return surrogate.predict(feature_matrix(shape, reynolds, mach, alpha))
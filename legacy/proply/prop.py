@@ -2,19 +2,26 @@
 # Copyright (c) 2016-2017. Tim Molteno tim@molteno.net
 #
 
+import os
 import math
+import tempfile
 import textwrap
 import logging
 
 import numpy as np
 
 from proply import foil
-from proply import stl_tools
+from proply import mesh_tools
 from proply import motor_model
+from proply import step_tools
+from proply import sector_mesher
 from proply import optimize
+from proply import render
 from proply.smooth import smooth
 
-from proply.blade_element import BladeElement
+from proply.blade_element import BladeElement, section_grid
+from proply.loft import BladeLoft
+from proply.foil_mesher import FoilMesher
 
 from scipy.interpolate import PchipInterpolator, interp1d
 
@@ -41,6 +48,11 @@ class Prop:
         self.n_blades = 2
         self.max_depth_interpolator = None
         self.scimitar_interpolator = None
+        self.first_fidelity = 0  # Polar tier the station optimizer starts on
+        self.escalation_tolerance = 0.05  # Relative cl, cd agreement to skip a tier
+        self.loft_tolerance = None  # Loft the exported surface to this (m)
+        self.chord_tolerance = None  # Resample the meshed sections to this (m)
+        self.adaptive_samples = 400  # Chordwise points sampled for the resampling
 
     def new_blade_element(self, foilclass, r, rpm, twist):
         y_limit = self.get_max_depth(r)
@@ -232,10 +244,9 @@ class Prop:
         geom = pg.Geometry()
 
         loops = []
-        for be in self.blade_elements:
-            car = 0.5 / 1000
-            line_l, line_u = be.get_foil_points(n, self.get_scimitar_offset(be.r))
-            loop_points = np.concatenate((line_l, line_u[::-1]), axis=0)
+        car = 0.5 / 1000
+        for lower, upper in self.export_grid(n):
+            loop_points = np.concatenate((lower, upper[::-1]), axis=0)
             g_pts = []
             for p in loop_points[0:-2]:
                 g_pts.append(geom.add_point(p, car))
@@ -277,45 +288,129 @@ class Prop:
 
         meshio.write(filename, points, cells)
 
-    def gen_stl(self, filename, n):
-        stl = stl_tools.STL()
-
-        scale = 1000.0  # Convert to mm.
-        top_lines = []
-        bottom_lines = []
-
-        bottom_edge = []
-        top_edge = []
+    def gen_section_meshes(self, settings=None, workers=None):
+        """2-D CFD meshes of every blade element section, meshed in
+        parallel and cached by shape. Returns the .msh files, hub first.
+        """
+        return FoilMesher(settings, workers=workers).mesh_blade(self)
 
-        hub_element = self.blade_elements[0]
-        x0, x1, y0, y1 = hub_element.foil.get_bounding_box(hub_element.get_twist())
+    def gen_sector_mesh(self, filename, n, settings=None, memory_mb=4096, cpu_seconds=3600):
+        """A gmsh volume mesh of a 1/n_blades periodic sector of the rotating
+        domain round one blade, meshed in a resource limited child process.
+        The blade is the export grid, so set loft_tolerance first to mesh
+        the loft.
+        """
+        if settings is None:
+            settings = sector_mesher.SectorSettings()
+        with tempfile.TemporaryDirectory() as workdir:
+            job = sector_mesher.sector_job(
+                self.export_grid(n) * 1000.0, self.n_blades, settings, workdir, filename
+            )
+            sector_mesher.run_job(job, memory_mb, cpu_seconds)
 
-        for be in self.blade_elements:
-            line_l, line_u = be.get_foil_points(n, self.get_scimitar_offset(be.r))
+    def surface_grid(self, n):
+        """The whole blade surface, (stations, 2, n, 3) in m.
 
-            top_lines.append(line_u * scale)
-            top_edge.append(line_u[-1, :] * scale)
+        One row per blade element, from the hub to the tip. [:, 0] is the
+        lower and [:, 1] the upper surface, leading edge to trailing edge.
+        """
+        r = np.array([be.r for be in self.blade_elements])
+        twist = np.array([be.get_twist() for be in self.blade_elements])
+        shapes = foil.section_shapes([be.foil for be in self.blade_elements], n)
+        return section_grid(shapes, twist, r, self.get_scimitar_offset(r))
+
+    def export_grid(self, n):
+        """The surface written by the exporters: the blade element rows, or
+        a loft through them when loft_tolerance is set.
+        """
+        if self.loft_tolerance is None:
+            return self.surface_grid(n)
+        return BladeLoft(self).grid(n, self.loft_tolerance)
+
+    def mesh_surface(self, n):
+        """The export grid in mm for the meshes. With chord_tolerance set,
+        a list of sections instead, each resampled to as few chordwise
+        points as keep within the tolerance (n is then not used).
+        """
+        scale = 1000.0  # Convert to mm.
+        if self.chord_tolerance is None:
+            return self.export_grid(n) * scale
+        grid = self.export_grid(self.adaptive_samples) * scale
+        return mesh_tools.adaptive_sections(grid, self.chord_tolerance * scale)
+
+    @staticmethod
+    def z_range(grid):
+        """Height range of the root section (the one at the smallest radius)
+        in a surface grid or list of sections, the y_min, y_max of the scad
+        files.
+        """
+        sections = [np.asarray(section) for section in grid]
+        radius = [np.mean(np.hypot(s[..., 0], s[..., 1])) for s in sections]
+        z = sections[int(np.argmin(radius))][..., 2]
+        return np.min(z), np.max(z)
 
-            bottom_lines.append(line_l * scale)
-            bottom_edge.append(line_l[-1, :] * scale)
+    def blade_mesh(self, n):
+        """ The blade as a closed, indexed mesh in mm """
+        return mesh_tools.blade_solid(self.mesh_surface(n))
 
-        stl.add_line(bottom_lines[0])
-        ## Do the top surface
-        for tl in top_lines:
-            stl.add_line(tl)
+    def gen_stl(self, filename, n):
+        """Write the blade as a watertight mesh. The format follows the
+        extension (.stl, .ply, .obj or .3mf).
+        """
+        surface = self.mesh_surface(n)
+        mesh_tools.blade_solid(surface).save(filename)
+        return self.z_range(surface)
+
+    def gen_lod(self, filename, n, factors=(2, 4, 8)):
+        """Write preview blades resampled from the n point export grid, with
+        1/k of its stations and chordwise points for each k in factors, as
+        filename with _lod<k> before the extension. Returns the filenames.
+        """
+        root, ext = os.path.splitext(filename)
+        filenames = []
+        for k, grid in zip(factors, mesh_tools.lod_grids(self.export_grid(n) * 1000.0, factors)):
+            name = "{}_lod{}{}".format(root, k, ext)
+            mesh_tools.blade_solid(grid).save(name)
+            filenames.append(name)
+        return filenames
+
+    def prop_mesh(self, n, ccw=False):
+        """ The whole propeller, blades and hub, as one closed mesh in mm """
+        scale = 1000.0  # Convert to mm.
+        return mesh_tools.prop_mesh(
+            self.mesh_surface(n),
+            self.n_blades,
+            self.param.hub_depth * scale,
+            self.param.center_hole * scale,
+            ccw=ccw,
+        )
 
-        ## Do the bottom surface
-        bottom_lines.reverse()
-        for bl in bottom_lines:
-            stl.add_line(bl)
+    def gen_prop_mesh(self, filename, n, ccw=False):
+        """Write the whole propeller, ready to print without OpenSCAD. The
+        format follows the extension, as gen_stl.
+        """
+        self.prop_mesh(n, ccw).save(filename)
 
-        ## Join the trailing edges
-        stl.new_block()
-        stl.add_line(bottom_edge)
-        stl.add_line(top_edge)
+    def gen_png(self, filename, n, ccw=False, renderer=None):
+        """ Render the whole propeller to a PNG, isometric and headless """
+        if renderer is None:
+            renderer = render.Renderer()
+        renderer.save(self.prop_mesh(n, ccw), filename)
 
-        stl.gen_stl(filename)
-        return y0 * scale, y1 * scale
+    def gen_step(self, filename, n, ccw=False):
+        """Write the propeller as exact B-spline blade surfaces and an
+        analytic hub, in a STEP (AP242) file.
+        """
+        scale = 1000.0  # Convert to mm.
+        step_tools.write_prop(
+            filename,
+            self.export_grid(n) * scale,
+            self.n_blades,
+            self.param.hub_depth * scale,
+            self.param.center_hole * scale,
+            name=self.param.name,
+            ccw=ccw,
+        )
 
     def gen_scad_header(self, f, y0, y1):
         blade_stl_filename = self.param.name + "_blade.stl"
@@ -440,18 +535,39 @@ class Prop:
                 x_limit, y_limit, prev_twist
             )  # Assumes that the foil chord is 1.0
 
-            x, fun = optimize.optimize_all(
-                foil_simulator=be.fs,
-                dv_goal=dv_modified,
-                rpm=optimum_rpm,
-                B=self.n_blades,
-                r=r,
-                dr=dr,
-                u_0=u_0,
-                maxchord=maxchord,
-            )
+            # Converge on the cheap polar tiers first, then refine with the
+            # next tier from there. Only the last run uses xfoil, and it
+            # starts at the converged design, so it only simulates the
+            # Reynolds buckets that design actually uses. Where the next
+            # tier agrees with this one at the converged point, the design
+            # stands and is not re-optimised.
+            x = None
+            optimise = True
+            be.fs.set_level(self.first_fidelity)
+            while True:
+                if optimise:
+                    x, fun = optimize.optimize_all(
+                        foil_simulator=be.fs,
+                        dv_goal=dv_modified,
+                        rpm=optimum_rpm,
+                        B=self.n_blades,
+                        r=r,
+                        dr=dr,
+                        u_0=u_0,
+                        maxchord=maxchord,
+                        x_guess=x,
+                    )
+                    be.set_chord(x[3])
+                    logger.info("r={} {} tier: err={}".format(r, be.fs.tier, fun))
+                if not be.fs.escalate():
+                    break
+                v_rel, alpha, _ = optimize.operating_point(x[1], x[2], x[0], omega, r, u_0)
+                optimise = not be.fs.agrees(
+                    be.fs.level - 1, v_rel, alpha, self.escalation_tolerance
+                )
+                if not optimise:
+                    logger.info("r={} {} tier agrees, keeping the design".format(r, be.fs.tier))
             theta, dv, a_prime, chord = x
-            be.set_chord(chord)
             # if (fun > 0.03):
             # logger.info("Rescan around {}".format(np.degrees(phi)))
             # opt = 9999.9
@@ -564,3 +680,14 @@ class ARADProp(Prop):
         from proply import foil_ARA
 
         return self.new_blade_element(foil_ARA.ARADFoil, r, rpm, twist)
+
+
+class FamilyProp(Prop):
+    """Prop that uses sections of a FoilFamily"""
+
+    def __init__(self, param, resolution, family):
+        Prop.__init__(self, param, resolution)
+        self.foilclass = family.foil_class()
+
+    def new_foil(self, r, rpm, twist):
+        return self.new_blade_element(self.foilclass, r, rpm, twist)
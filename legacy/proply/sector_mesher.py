@@ -0,0 +1,265 @@
+"""
+    Periodic sector volume meshes of the rotating domain
+
+    The flow round a rotor with B identical blades is periodic, so only a
+    1/B sector of the rotating domain needs meshing: one blade in a wedge
+    of the domain cylinder, the two cut planes made periodic. The hub is
+    taken to run through the whole domain. Air flows towards -z.
+
+    The blade goes to gmsh as exact surfaces (a STEP file from step_tools),
+    and the mesh is refined round the blade, more round its tip, and in a
+    cylinder down the wake. Sizes are in blade radii.
+
+    gmsh runs in a separate Python process (python -m proply.sector_mesher
+    job.json) with limits on its memory and cpu time, so that a mesh that
+    grows out of hand cannot take the design run down with it.
+"""
+import os
+import sys
+import json
+import subprocess
+
+import numpy as np
+
+import logging
+
+from proply.step_tools import StepWriter, BladeSurfaces
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+
+class SectorSettings:
+    """Domain and mesh sizes, in blade radii.
+
+    The domain reaches out to radius, upstream above and downstream below
+    the blade. Cells are blade_size on the blade, tip_size within
+    tip_distance of the tip face and wake_size in a cylinder wake_radius
+    across, wake_length down from the blade, growing to far_size.
+    """
+
+    def __init__(
+        self,
+        radius=2.0,
+        upstream=2.0,
+        downstream=5.0,
+        blade_size=0.01,
+        tip_size=0.004,
+        tip_distance=0.1,
+        wake_size=0.04,
+        wake_radius=1.1,
+        wake_length=3.0,
+        far_size=0.3,
+        hub_scale=1.01,
+        algorithm=1,
+        threads=1,
+    ):
+        self.radius = radius
+        self.upstream = upstream
+        self.downstream = downstream
+        self.blade_size = blade_size
+        self.tip_size = tip_size
+        self.tip_distance = tip_distance
+        self.wake_size = wake_size
+        self.wake_radius = wake_radius
+        self.wake_length = wake_length
+        self.far_size = far_size
+        self.hub_scale = hub_scale
+        self.algorithm = algorithm
+        self.threads = threads
+
+
+def sector_job(grid, n_blades, settings, workdir, filename):
+    """Write the blade (a (stations, 2, n, 3) grid in mm) as STEP and the
+    job description for main() into workdir. Returns the job file.
+    """
+    if n_blades < 2:
+        raise ValueError("A periodic sector needs two or more blades")
+    grid = np.asarray(grid, dtype=float)
+    rho = np.hypot(grid[..., 0], grid[..., 1])
+    theta = np.arctan2(grid[..., 1], grid[..., 0])
+    centre = np.angle(np.mean(np.exp(1j * theta)))
+    if np.max(np.abs(np.angle(np.exp(1j * (theta - centre))))) >= np.pi / n_blades:
+        raise ValueError("The blade is wider than its 1/{} sector".format(n_blades))
+
+    os.makedirs(workdir, exist_ok=True)
+    step = os.path.join(workdir, "blade.step")
+    with StepWriter(step, "blade") as w:
+        BladeSurfaces(grid).write(w)
+
+    job = dict(vars(settings))
+    job.update(
+        {
+            "blade": os.path.abspath(step),
+            "output": os.path.abspath(filename),
+            "n_blades": n_blades,
+            "centre": float(centre),
+            "tip_radius": float(np.max(rho)),
+            "root_radius": float(np.min(rho)),
+            "z_min": float(np.min(grid[..., 2])),
+            "z_max": float(np.max(grid[..., 2])),
+        }
+    )
+    path = os.path.join(workdir, "job.json")
+    with open(path, "w") as fd:
+        json.dump(job, fd, indent=1)
+    return path
+
+
+def run_job(job, memory_mb=4096, cpu_seconds=3600, timeout=None):
+    """Run main() on the job file in a child process, limited to memory_mb
+    of address space and cpu_seconds of cpu time (where the OS supports
+    resource limits). Raises CalledProcessError if the child fails.
+    """
+
+    def limits():
+        mb = 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (memory_mb * mb, memory_mb * mb))
+        resource.setrlimit(resource.RLIMIT_CPU, (cpu_seconds, cpu_seconds))
+
+    if resource is None:
+        logger.warning("No resource limits on this platform, meshing unlimited")
+    subprocess.run(
+        [sys.executable, "-m", "proply.sector_mesher", job],
+        check=True,
+        timeout=timeout,
+        preexec_fn=limits if resource is not None else None,
+    )
+
+
+def rotation(angle):
+    """ The 4x4 affine transform, row major, of a rotation about z """
+    c = np.cos(angle)
+    s = np.sin(angle)
+    return [c, -s, 0, 0, s, c, 0, 0, 0, 0, 1, 0, 0, 0, 0, 1]
+
+
+def mesh_sector(job):
+    """ Build and mesh the sector described by a job dict (in the child) """
+    import gmsh
+
+    R = job["tip_radius"]
+    B = job["n_blades"]
+    wedge = 2.0 * np.pi / B
+    theta0 = job["centre"] - wedge / 2
+    z0 = job["z_min"] - job["downstream"] * R
+    z1 = job["z_max"] + job["upstream"] * R
+    r_hub = job["root_radius"] * job["hub_scale"]
+
+    gmsh.initialize()
+    try:
+        gmsh.option.setNumber("General.Terminal", 1)
+        gmsh.option.setNumber("General.NumThreads", job["threads"])
+        gmsh.option.setString("Geometry.OCCTargetUnit", "MM")
+        occ = gmsh.model.occ
+        gmsh.model.add("sector")
+
+        blade = occ.importShapes(job["blade"])
+        bbox = np.array(occ.getBoundingBox(*blade[0]))
+        for dt in blade[1:]:
+            b = occ.getBoundingBox(*dt)
+            bbox = np.concatenate((np.minimum(bbox[:3], b[:3]), np.maximum(bbox[3:], b[3:])))
+
+        domain = occ.addCylinder(0, 0, z0, 0, 0, z1 - z0, job["radius"] * R, angle=wedge)
+        occ.rotate([(3, domain)], 0, 0, 0, 0, 0, 1, theta0)
+        hub = occ.addCylinder(0, 0, z0 - R, 0, 0, z1 - z0 + 2 * R, r_hub)
+        fluid, _ = occ.cut([(3, domain)], blade + [(3, hub)])
+        occ.synchronize()
+        if len(fluid) != 1:
+            raise RuntimeError("Expected one fluid volume, got {}".format(fluid))
+        volume = fluid[0][1]
+
+        groups = {"blade": [], "hub": [], "outer": [], "inlet": [], "outlet": []}
+        sides = [[], []]
+        tol = 1e-6 * R
+        box = bbox + np.array([-tol] * 3 + [tol] * 3)
+        tip = None
+        for dim, s in gmsh.model.getBoundary([(3, volume)], oriented=False):
+            b = np.array(gmsh.model.getBoundingBox(2, s))
+            x, y, z = occ.getCenterOfMass(2, s)
+            if np.all(b[:3] >= box[:3]) and np.all(b[3:] <= box[3:]):
+                groups["blade"].append(s)
+                if tip is None or np.hypot(x, y) > tip[1]:
+                    tip = (s, np.hypot(x, y))
+            elif abs(z - z0) < tol:
+                groups["outlet"].append(s)
+            elif abs(z - z1) < tol:
+                groups["inlet"].append(s)
+            elif abs(np.angle(np.exp(1j * (np.arctan2(y, x) - theta0)))) < 1e-6:
+                sides[0].append(s)
+            elif abs(np.angle(np.exp(1j * (np.arctan2(y, x) - theta0 - wedge)))) < 1e-6:
+                sides[1].append(s)
+            elif np.hypot(x, y) < r_hub:
+                groups["hub"].append(s)
+            else:
+                groups["outer"].append(s)
+        if len(sides[0]) != 1 or len(sides[1]) != 1:
+            raise RuntimeError("Could not find the periodic sides: {}".format(sides))
+        gmsh.model.mesh.setPeriodic(2, sides[1], sides[0], rotation(wedge))
+
+        field = gmsh.model.mesh.field
+        field.add("Distance", 1)
+        field.setNumbers(1, "SurfacesList", groups["blade"])
+        field.setNumber(1, "Sampling", 100)
+        field.add("Threshold", 2)
+        field.setNumber(2, "InField", 1)
+        field.setNumber(2, "SizeMin", job["blade_size"] * R)
+        field.setNumber(2, "SizeMax", job["far_size"] * R)
+        field.setNumber(2, "DistMin", job["blade_size"] * R)
+        field.setNumber(2, "DistMax", job["radius"] * R / 2)
+        field.add("Distance", 3)
+        field.setNumbers(3, "SurfacesList", [tip[0]])
+        field.setNumber(3, "Sampling", 100)
+        field.add("Threshold", 4)
+        field.setNumber(4, "InField", 3)
+        field.setNumber(4, "SizeMin", job["tip_size"] * R)
+        field.setNumber(4, "SizeMax", job["far_size"] * R)
+        field.setNumber(4, "DistMin", job["tip_size"] * R)
+        field.setNumber(4, "DistMax", job["tip_distance"] * R)
+        half = job["wake_length"] * R / 2
+        field.add("Cylinder", 5)
+        field.setNumber(5, "Radius", job["wake_radius"] * R)
+        field.setNumber(5, "VIn", job["wake_size"] * R)
+        field.setNumber(5, "VOut", job["far_size"] * R)
+        field.setNumber(5, "ZCenter", job["z_min"] - half)
+        field.setNumber(5, "ZAxis", half)
+        field.add("Min", 6)
+        field.setNumbers(6, "FieldsList", [2, 4, 5])
+        field.setAsBackgroundMesh(6)
+        gmsh.option.setNumber("Mesh.MeshSizeExtendFromBoundary", 0)
+        gmsh.option.setNumber("Mesh.MeshSizeFromPoints", 0)
+        gmsh.option.setNumber("Mesh.MeshSizeFromCurvature", 0)
+        gmsh.option.setNumber("Mesh.Algorithm3D", job["algorithm"])
+
+        def physical(dim, tags, name):
+            gmsh.model.setPhysicalName(dim, gmsh.model.addPhysicalGroup(dim, tags), name)
+
+        physical(3, [volume], "fluid")
+        for name, tags in groups.items():
+            if tags:
+                physical(2, tags, name)
+        physical(2, sides[0], "periodic_0")
+        physical(2, sides[1], "periodic_1")
+
+        gmsh.model.mesh.generate(3)
+        output = job["output"]
+        root, ext = os.path.splitext(output)
+        tmp = "{}.{}{}".format(root, os.getpid(), ext)
+        gmsh.write(tmp)
+        os.replace(tmp, output)
+    finally:
+        gmsh.finalize()
+
+
+def main(argv):
+    with open(argv[0], "r") as fd:
+        job = json.load(fd)
+    mesh_sector(job)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,433 @@
+"""
+    STEP (AP242) export
+
+    The blade is written as exact surfaces instead of triangles. The
+    lower and upper sides are bicubic B-spline surfaces interpolating the
+    blade element sections, closed by ruled trailing edge and end caps.
+    The hub is a cylinder with a bore, written as analytic cylindrical and
+    planar faces.
+
+    Entities go to the file as they are created, each one referring only
+    to entities already written, so the file is produced in one pass.
+"""
+import datetime
+
+import numpy as np
+from scipy.interpolate import make_interp_spline
+
+import logging
+
+from proply.mesh_tools import hub_extent, rotation_z
+
+logger = logging.getLogger(__name__)
+
+STEP_SCHEMA = "AP242_MANAGED_MODEL_BASED_3D_ENGINEERING_MIM_LF { 1 0 10303 442 1 1 4 }"
+
+
+class Raw(str):
+    """ An instance reference or enumeration, written as it is """
+
+
+def step_real(x):
+    s = "%.10G" % x
+    if "." not in s:
+        m, e, ex = s.partition("E")
+        s = m + "." + e + ex
+    return s
+
+
+def step_value(v):
+    if isinstance(v, Raw):
+        return v
+    if isinstance(v, str):
+        return "'" + v.replace("'", "''") + "'"
+    if isinstance(v, (bool, np.bool_)):
+        return ".T." if v else ".F."
+    if isinstance(v, (int, np.integer)):
+        return str(int(v))
+    if isinstance(v, (float, np.floating)):
+        return step_real(v)
+    return "(" + ",".join(step_value(x) for x in v) + ")"
+
+
+class StepWriter:
+    """Write a STEP part file entity by entity.
+
+    dest is a filename or a text file object. add() writes an entity and
+    returns its reference, so entities must be added before anything that
+    refers to them. The geometry is in mm.
+    """
+
+    def __init__(self, dest, name="proply", tolerance=1e-5):
+        self.own = isinstance(dest, str)
+        self.f = open(dest, "w") if self.own else dest
+        self.count = 0
+        self.items = []
+        self.name = name
+
+        stamp = datetime.datetime.now().strftime("%Y-%m-%dT%H:%M:%S")
+        self.f.write("ISO-10303-21;\nHEADER;\n")
+        self.f.write("FILE_DESCRIPTION(('{}'),'2;1');\n".format(name))
+        self.f.write(
+            "FILE_NAME('{}.step','{}',(''),(''),'proply','proply','');\n".format(
+                name, stamp
+            )
+        )
+        self.f.write("FILE_SCHEMA(('{}'));\nENDSEC;\nDATA;\n".format(STEP_SCHEMA))
+
+        app = self.add("APPLICATION_CONTEXT", "managed model based 3d engineering")
+        self.add(
+            "APPLICATION_PROTOCOL_DEFINITION",
+            "international standard",
+            "ap242_managed_model_based_3d_engineering",
+            2014,
+            app,
+        )
+        product = self.add(
+            "PRODUCT", name, name, "", [self.add("PRODUCT_CONTEXT", "", app, "mechanical")]
+        )
+        formation = self.add("PRODUCT_DEFINITION_FORMATION", "", "", product)
+        context = self.add("PRODUCT_DEFINITION_CONTEXT", "part definition", app, "design")
+        definition = self.add("PRODUCT_DEFINITION", "design", "", formation, context)
+        self.shape = self.add("PRODUCT_DEFINITION_SHAPE", "", "", definition)
+
+        length = self.raw("(LENGTH_UNIT()NAMED_UNIT(*)SI_UNIT(.MILLI.,.METRE.))")
+        angle = self.raw("(NAMED_UNIT(*)PLANE_ANGLE_UNIT()SI_UNIT($,.RADIAN.))")
+        solid_angle = self.raw("(NAMED_UNIT(*)SI_UNIT($,.STERADIAN.)SOLID_ANGLE_UNIT())")
+        uncertainty = self.raw(
+            "UNCERTAINTY_MEASURE_WITH_UNIT(LENGTH_MEASURE({}),{},"
+            "'distance_accuracy_value','')".format(step_real(tolerance), length)
+        )
+        self.context = self.raw(
+            "(GEOMETRIC_REPRESENTATION_CONTEXT(3)"
+            "GLOBAL_UNCERTAINTY_ASSIGNED_CONTEXT(({}))"
+            "GLOBAL_UNIT_ASSIGNED_CONTEXT(({},{},{}))"
+            "REPRESENTATION_CONTEXT('',''))".format(uncertainty, length, angle, solid_angle)
+        )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def raw(self, text):
+        self.count += 1
+        ref = Raw("#{}".format(self.count))
+        self.f.write("{}={};\n".format(ref, text))
+        return ref
+
+    def add(self, entity, *args):
+        return self.raw("{}({})".format(entity, ",".join(step_value(a) for a in args)))
+
+    def point(self, p):
+        return self.add("CARTESIAN_POINT", "", [float(x) for x in p])
+
+    def direction(self, d):
+        return self.add("DIRECTION", "", [float(x) for x in d])
+
+    def placement(self, origin, axis=(0, 0, 1), ref_dir=(1, 0, 0)):
+        return self.add(
+            "AXIS2_PLACEMENT_3D",
+            "",
+            self.point(origin),
+            self.direction(axis),
+            self.direction(ref_dir),
+        )
+
+    def vertex(self, p):
+        return self.add("VERTEX_POINT", "", self.point(p))
+
+    @staticmethod
+    def knot_lists(t):
+        knots, mults = np.unique(np.round(t, 12), return_counts=True)
+        return [int(m) for m in mults], [float(k) for k in knots]
+
+    def bspline_curve(self, degree, ctrl, t):
+        mults, knots = self.knot_lists(t)
+        return self.add(
+            "B_SPLINE_CURVE_WITH_KNOTS",
+            "",
+            int(degree),
+            [self.point(p) for p in ctrl],
+            Raw(".UNSPECIFIED."),
+            False,
+            False,
+            mults,
+            knots,
+            Raw(".UNSPECIFIED."),
+        )
+
+    def bspline_surface(self, degree_u, degree_v, ctrl, tu, tv):
+        mults_u, knots_u = self.knot_lists(tu)
+        mults_v, knots_v = self.knot_lists(tv)
+        return self.add(
+            "B_SPLINE_SURFACE_WITH_KNOTS",
+            "",
+            int(degree_u),
+            int(degree_v),
+            [[self.point(p) for p in row] for row in ctrl],
+            Raw(".UNSPECIFIED."),
+            False,
+            False,
+            False,
+            mults_u,
+            mults_v,
+            knots_u,
+            knots_v,
+            Raw(".UNSPECIFIED."),
+        )
+
+    def line(self, a, b):
+        a = np.asarray(a, dtype=float)
+        d = np.asarray(b, dtype=float) - a
+        length = np.linalg.norm(d)
+        vector = self.add("VECTOR", "", self.direction(d / length), float(length))
+        return self.add("LINE", "", self.point(a), vector)
+
+    def circle(self, r, z):
+        return self.add("CIRCLE", "", self.placement((0, 0, z)), float(r))
+
+    def edge(self, start, end, curve):
+        return self.add("EDGE_CURVE", "", start, end, curve, True)
+
+    def face(self, surface, same_sense, bounds):
+        """A face bounded by loops of (edge, orientation), the first the
+        outer bound.
+        """
+        refs = []
+        for k, loop in enumerate(bounds):
+            edges = [self.add("ORIENTED_EDGE", "", Raw("*"), Raw("*"), e, s) for e, s in loop]
+            entity = "FACE_OUTER_BOUND" if k == 0 else "FACE_BOUND"
+            refs.append(self.add(entity, "", self.add("EDGE_LOOP", "", edges), True))
+        return self.add("ADVANCED_FACE", "", refs, surface, bool(same_sense))
+
+    def solid(self, name, faces):
+        """ A solid from faces forming a closed, consistently oriented shell """
+        shell = self.add("CLOSED_SHELL", "", faces)
+        brep = self.add("MANIFOLD_SOLID_BREP", name, shell)
+        self.items.append(brep)
+        return brep
+
+    def close(self):
+        if self.f is None:
+            return
+        origin = self.placement((0, 0, 0))
+        representation = self.add(
+            "ADVANCED_BREP_SHAPE_REPRESENTATION", self.name, [origin] + self.items, self.context
+        )
+        self.add("SHAPE_DEFINITION_REPRESENTATION", self.shape, representation)
+        self.f.write("ENDSEC;\nEND-ISO-10303-21;\n")
+        if self.own:
+            self.f.close()
+        self.f = None
+
+
+def chord_parameters(points):
+    """ Chord length parameters along axis -2, averaged over the other axes """
+    d = np.linalg.norm(np.diff(points, axis=-2), axis=-1)
+    d = d.reshape(-1, d.shape[-1]).mean(axis=0)
+    u = np.concatenate(([0.0], np.cumsum(d)))
+    return u / u[-1]
+
+
+def net_normal(ctrl):
+    """ Normal of a control net (nu, nv, 3) in its middle """
+    i = min(len(ctrl) // 2, len(ctrl) - 2)
+    j = min(ctrl.shape[1] // 2, ctrl.shape[1] - 2)
+    return np.cross(ctrl[i + 1, j] - ctrl[i, j], ctrl[i, j + 1] - ctrl[i, j])
+
+
+class BladeSurfaces:
+    """Bicubic B-spline surfaces through a (stations, 2, n, 3) blade grid.
+
+    The control nets ctrl[:, 0] (lower) and ctrl[:, 1] (upper) are indexed
+    [span][chord], the span running from the root to the tip, with knots
+    t_span and t_chord. The sections share one chordwise parametrisation,
+    so the section, leading and trailing edge curves are rows and columns
+    of the nets.
+    """
+
+    def __init__(self, grid, tolerance=1e-6):
+        grid = np.array(grid, dtype=float)
+        radius = np.hypot(grid[..., 0], grid[..., 1])
+        if np.mean(radius[0]) > np.mean(radius[-1]):
+            grid = grid[::-1]  # Root first
+        stations, _, n, _ = grid.shape
+        if stations < 2:
+            raise ValueError("A blade surface needs two or more sections")
+
+        grid[:, 1, 0] = grid[:, 0, 0]  # One leading edge
+        self.closed_te = np.all(
+            np.linalg.norm(grid[:, 0, -1] - grid[:, 1, -1], axis=-1) < tolerance
+        )
+        if self.closed_te:
+            grid[:, 1, -1] = grid[:, 0, -1]
+
+        u = chord_parameters(grid)
+        chordwise = make_interp_spline(u, grid, k=min(3, n - 1), axis=2)
+        self.t_chord = chordwise.t
+        self.degree_chord = chordwise.k
+        ctrl = np.moveaxis(chordwise.c, 0, 2)  # (stations, 2, n, 3)
+
+        v = chord_parameters(np.moveaxis(grid, 0, -2))
+        spanwise = make_interp_spline(v, ctrl, k=min(3, stations - 1), axis=0)
+        self.t_span = spanwise.t
+        self.degree_span = spanwise.k
+        self.ctrl = spanwise.c
+        self.root = grid[0].reshape(-1, 3)
+
+    def transformed(self, matrix):
+        """ A copy with the control points mapped by the 3x3 matrix """
+        copy = object.__new__(BladeSurfaces)
+        copy.__dict__.update(self.__dict__)
+        copy.ctrl = self.ctrl @ np.asarray(matrix).T
+        copy.root = self.root @ np.asarray(matrix).T
+        return copy
+
+    def write(self, w, name="blade"):
+        """Write the blade to the StepWriter w as a solid of five faces:
+        the lower and upper sides, the trailing edge and the two end caps.
+        """
+        lower = self.ctrl[:, 0]
+        upper = self.ctrl[:, 1]
+        ks, kc = self.degree_span, self.degree_chord
+        ts, tc = self.t_span, self.t_chord
+        line = np.array([0.0, 0.0, 1.0, 1.0])
+
+        le = lower[:, 0]
+        te_l = lower[:, -1]
+        te_u = upper[:, -1]
+
+        v_le = [w.vertex(le[0]), w.vertex(le[-1])]
+        v_tl = [w.vertex(te_l[0]), w.vertex(te_l[-1])]
+        v_tu = v_tl if self.closed_te else [w.vertex(te_u[0]), w.vertex(te_u[-1])]
+
+        # Edges run root to tip, leading edge to trailing edge and lower to upper
+        e_le = w.edge(v_le[0], v_le[1], w.bspline_curve(ks, le, ts))
+        e_tl = w.edge(v_tl[0], v_tl[1], w.bspline_curve(ks, te_l, ts))
+        if self.closed_te:
+            e_tu = e_tl
+        else:
+            e_tu = w.edge(v_tu[0], v_tu[1], w.bspline_curve(ks, te_u, ts))
+        section_l = []
+        section_u = []
+        te_seg = []
+        for k in (0, -1):
+            section_l.append(w.edge(v_le[k], v_tl[k], w.bspline_curve(kc, lower[k], tc)))
+            section_u.append(w.edge(v_le[k], v_tu[k], w.bspline_curve(kc, upper[k], tc)))
+            if not self.closed_te:
+                te_seg.append(w.edge(v_tl[k], v_tu[k], w.line(te_l[k], te_u[k])))
+
+        def face(ctrl, degrees, knots, loop, outward):
+            """Loops are given counter-clockwise in the (u, v) parameters,
+            so round the natural normal. Faces whose normal points inward
+            are reversed.
+            """
+            surface = w.bspline_surface(degrees[0], degrees[1], ctrl, knots[0], knots[1])
+            same_sense = np.dot(net_normal(ctrl), outward) > 0
+            if not same_sense:
+                loop = [(e, not s) for e, s in loop[::-1]]
+            return w.face(surface, same_sense, [loop])
+
+        thickness = upper[:, 1:-1].mean(axis=(0, 1)) - lower[:, 1:-1].mean(axis=(0, 1))
+        span = le[-1] - le[0]
+        faces = [
+            face(
+                lower,
+                (ks, kc),
+                (ts, tc),
+                [(e_le, True), (section_l[1], True), (e_tl, False), (section_l[0], False)],
+                -thickness,
+            ),
+            face(
+                upper,
+                (ks, kc),
+                (ts, tc),
+                [(e_le, True), (section_u[1], True), (e_tu, False), (section_u[0], False)],
+                thickness,
+            ),
+        ]
+        for k, outward in ((0, -span), (-1, span)):
+            loop = [(section_l[k], True), (section_u[k], False)]
+            if not self.closed_te:
+                loop.insert(1, (te_seg[k], True))
+            cap = np.stack([lower[k], upper[k]], axis=1)
+            faces.append(face(cap, (kc, 1), (tc, line), loop, outward))
+        if not self.closed_te:
+            cap = np.stack([te_l, te_u], axis=1)
+            chord = te_l.mean(axis=0) - le.mean(axis=0)
+            loop = [(e_tl, True), (te_seg[1], True), (e_tu, False), (te_seg[0], False)]
+            faces.append(face(cap, (ks, 1), (ts, line), loop, chord))
+
+        return w.solid(name, faces)
+
+
+def write_hub(w, r, z0, z1, r_hole=0.0):
+    """Write a hub cylinder of radius r from z0 to z1 with a bore of radius
+    r_hole (none if 0). Each circle is two half circle edges, so every edge
+    bounds exactly two faces, and each cylinder has one seam.
+    """
+    if r_hole >= r:
+        raise ValueError("The centre hole ({} mm) is wider than the hub".format(2 * r_hole))
+
+    def circle(radius, z):
+        curve = w.circle(radius, z)
+        a = w.vertex((radius, 0, z))
+        b = w.vertex((-radius, 0, z))
+        return a, [w.edge(a, b, curve), w.edge(b, a, curve)]
+
+    b0, bottom = circle(r, z0)
+    t0, top = circle(r, z1)
+    seam = w.edge(b0, t0, w.line((r, 0, z0), (r, 0, z1)))
+    cylinder = w.add("CYLINDRICAL_SURFACE", "", w.placement((0, 0, z0)), float(r))
+    loop = [
+        (bottom[0], True),
+        (bottom[1], True),
+        (seam, True),
+        (top[1], False),
+        (top[0], False),
+        (seam, False),
+    ]
+    faces = [w.face(cylinder, True, [loop])]
+    bottom_bounds = [[(bottom[0], False), (bottom[1], False)]]
+    top_bounds = [[(top[0], True), (top[1], True)]]
+
+    if r_hole > 0:
+        c0, bore_bottom = circle(r_hole, z0)
+        d0, bore_top = circle(r_hole, z1)
+        bore_seam = w.edge(c0, d0, w.line((r_hole, 0, z0), (r_hole, 0, z1)))
+        bore = w.add("CYLINDRICAL_SURFACE", "", w.placement((0, 0, z0)), float(r_hole))
+        loop = [
+            (bore_seam, True),
+            (bore_top[0], True),
+            (bore_top[1], True),
+            (bore_seam, False),
+            (bore_bottom[1], False),
+            (bore_bottom[0], False),
+        ]
+        faces.append(w.face(bore, False, [loop]))
+        bottom_bounds.append([(bore_bottom[0], True), (bore_bottom[1], True)])
+        top_bounds.append([(bore_top[0], False), (bore_top[1], False)])
+
+    bottom_plane = w.add("PLANE", "", w.placement((0, 0, z0), (0, 0, -1)))
+    faces.append(w.face(bottom_plane, True, bottom_bounds))
+    faces.append(w.face(w.add("PLANE", "", w.placement((0, 0, z1))), True, top_bounds))
+    return w.solid("hub", faces)
+
+
+def write_prop(dest, grid, n_blades, hub_height, center_hole, name="proply", ccw=False):
+    """Write a propeller as a STEP part: n_blades solids through the blade
+    surface grid (stations, 2, n, 3) in mm, and a hub placed on the blade
+    root as in mesh_tools.prop_mesh.
+    """
+    blade = BladeSurfaces(grid)
+    r_hub, z0, z1 = hub_extent(blade.root, hub_height)
+    mirror = np.diag([-1.0, 1.0, 1.0]) if ccw else np.eye(3)
+
+    with StepWriter(dest, name) as w:
+        for k in range(n_blades):
+            matrix = mirror @ rotation_z(2.0 * np.pi * k / n_blades)
+            blade.transformed(matrix).write(w, "blade {}".format(k + 1))
+        write_hub(w, r_hub, z0, z1, center_hole / 2.0)
+        logger.info("STEP: {} entities".format(w.count))
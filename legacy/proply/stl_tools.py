@@ -1,99 +1,113 @@
-from stl.mesh import Mesh
-from stl.base import RemoveDuplicates
-
 import numpy as np
 
-from proply import foil
-
-
-class STL:
-    def __init__(self):
-        self.blocks = []
-        self.new_block()
-
-    def new_block(self):
-        b = Block()
-        self.blocks.append(b)
-
-    def add_line(self, line):
-        self.blocks[-1].add_line(line)
-
-    def gen_stl(self, fname):
-        vertices = []
-        faces = []
-
-        cube = Mesh(
-            np.concatenate([b.gen_stl().data.copy() for b in self.blocks]),
-            remove_duplicate_polygons=RemoveDuplicates.NONE,
-        )
-
-        cube.save(fname)
-
-
-class Block:
-    """A block of equal length lines"""
-
-    def __init__(self):
-        self.lines = []
-        self.n = None
-
-    def add_line(self, line):
-        """ Each line is a list of 3D points (vertices)"""
-        self.lines.append(line)
-        self.n = len(line)
-
-    def index(self, line, i):
-        return line * self.n + i
-
-    def gen_stl(self):
-
-        vertices = []
-        faces = []
-
-        for l in self.lines:
-            for v in l:
-                vertices.append(v)
-
-        faces = []
-        for n, l in enumerate(self.lines[:-1]):
-            for i, p in enumerate(l[:-1]):
-                p0 = self.index(n, i)
-                p1 = self.index(n, i + 1)
-                p2 = self.index(n + 1, i)
-                faces.append([p1, p0, p2])
-                p0 = self.index(n + 1, i)
-                p1 = self.index(n + 1, i + 1)
-                p2 = self.index(n, i + 1)
-                faces.append([p0, p1, p2])
-
-        vertices = np.array(vertices)
-        faces = np.array(faces)
-        cube = Mesh(
-            np.zeros(faces.shape[0], dtype=Mesh.dtype),
-            remove_duplicate_polygons=RemoveDuplicates.NONE,
-        )
-        for i, f in enumerate(faces):
-            for j in range(3):
-                cube.vectors[i][j] = vertices[f[j], :]
-
-        return cube
-
-
-if __name__ == "__main__":
-
-    f1 = np.array([[0, 1, 2, 3, 4], [0, 0, 0, 0, 0], [0, 0, 0, 0, 0]]).T
-    f2 = np.array([[0, 1, 2, 3, 4], [1, 1, 1, 1, 1], [0, 0, 0, 0, 0]]).T
-    f3 = np.array([[0, 1, 2, 3, 4], [2, 2, 2, 2.1, 2], [1, 1, 1, 1, 1]]).T
-
-    s = STL()
-
-    s.add_line(f1)
-    s.add_line(f2)
-    s.add_line(f3)
-    s.add_line(f1)
-
-    s.new_block()
-    s.add_line(np.array([f1[0], f2[0]]))
-    s.add_line(np.array([f3[0]]))
+# One binary STL triangle: normal, three corners and the attribute count
+STL_RECORD = np.dtype([("normals", "<f4", (3,)), ("vectors", "<f4", (3, 3)), ("attr", "<u2")])
+STL_HEADER_BYTES = 80
+
+
+class StlWriter:
+    """Stream triangles into a binary STL.
+
+    dest is a filename or a binary file object. The triangle count in the
+    header is back-patched on close, so a file object must be seekable
+    unless n_triangles is given up front. With use_mmap (a filename and
+    n_triangles needed) the file is sized once and the records are
+    written through a memory map.
+
+    Normals are computed chunk by chunk as triangles arrive, so memory
+    use does not grow with the size of the mesh.
+    """
+
+    def __init__(self, dest, n_triangles=None, use_mmap=False, header=b"proply", chunk=65536):
+        self.n_triangles = n_triangles
+        self.count = 0
+        self.chunk = chunk
+        self.records = None
+        self.own = isinstance(dest, str)
+        header = header[:STL_HEADER_BYTES].ljust(STL_HEADER_BYTES, b" ")
+
+        if use_mmap:
+            if not self.own or n_triangles is None:
+                raise ValueError("mmap output needs a filename and the triangle count")
+            with open(dest, "wb") as f:
+                f.write(header)
+                f.write(np.uint32(n_triangles).tobytes())
+            self.records = np.memmap(
+                dest,
+                dtype=STL_RECORD,
+                mode="r+",
+                offset=STL_HEADER_BYTES + 4,
+                shape=(n_triangles,),
+            )
+            self.f = None
+        else:
+            self.f = open(dest, "wb") if self.own else dest
+            self.f.write(header)
+            self.f.write(np.uint32(n_triangles or 0).tobytes())
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    @staticmethod
+    def normals(triangles):
+        """ Unit normals (zero for degenerate triangles) """
+        n = np.cross(triangles[:, 1] - triangles[:, 0], triangles[:, 2] - triangles[:, 0])
+        length = np.linalg.norm(n, axis=1, keepdims=True)
+        return np.divide(n, length, out=np.zeros_like(n), where=length > 0)
+
+    def write(self, triangles):
+        """ Append (k, 3, 3) triangle corners """
+        triangles = np.asarray(triangles, dtype=float)
+        for start in range(0, len(triangles), self.chunk):
+            t = triangles[start : start + self.chunk]
+            if self.records is not None:
+                out = self.records[self.count : self.count + len(t)]
+                if len(out) != len(t):
+                    raise ValueError("More triangles than the mmap was sized for")
+            else:
+                out = np.zeros(len(t), dtype=STL_RECORD)
+            out["normals"] = self.normals(t)
+            out["vectors"] = t
+            if self.records is None:
+                self.f.write(out.tobytes())
+            self.count += len(t)
+
+    def close(self):
+        if self.records is not None:
+            self.records.flush()
+            self.records = None
+            if self.count != self.n_triangles:
+                raise ValueError(
+                    "Wrote {} of {} triangles".format(self.count, self.n_triangles)
+                )
+            return
+        if self.f is None:
+            return
+        if self.count != self.n_triangles:
+            if self.n_triangles is not None and not self.f.seekable():
+                raise ValueError(
+                    "Wrote {} of {} triangles".format(self.count, self.n_triangles)
+                )
+            end = self.f.tell()
+            self.f.seek(STL_HEADER_BYTES)
+            self.f.write(np.uint32(self.count).tobytes())
+            self.f.seek(end)
+        if self.own:
+            self.f.close()
+        self.f = None
+
+    def abort(self):
+        """ Release the file after an error, without checking the count """
+        if self.records is not None:
+            self.records.flush()
+            self.records = None
+        if self.f is not None and self.own:
+            self.f.close()
+        self.f = None
 
-    s.gen_stl("temp.stl")
@@ -20,19 +20,20 @@ setup(
     author="Tim Molteno",
     author_email="tim@elec.ac.nz",
     license="GPLv3",
-    install_requires=["scipy", "matplotlib", "pyaml", "numpy", "numpy-stl",
+    install_requires=["scipy", "matplotlib", "pyaml", "numpy",
                       "xfoil @ https://github.com/mxjeff/xfoil-python/tarball/master"],
     package_data={
         "proply": [
             "sql/foil_simulator.sql",
             "foils/foil_simulator.sql",
+            "foils/ara_d_table.npz",
         ]
     },
     include_package_data=True,
     test_suite="nose.collector",
     tests_require=["nose"],
     packages=["proply", "proply.sql", "proply.foils", "proply.templates"],
-    scripts=["bin/proply"],
+    scripts=["bin/proply", "bin/proply-render"],
     classifiers=[
         "Development Status :: 4 - Beta",
         "Topic :: Scientific/Engineering",
@@ -0,0 +1,43 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+LEGACY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, LEGACY)
+
+PROPS = os.path.join(os.path.dirname(LEGACY), "props")
+
+
+def make_prop(cls, stations=12):
+    """A prop with a smooth made-up chord and twist at each station, hub
+    first as full_optimize leaves them, without running the optimizer.
+    """
+    from proply.design_parameters import DesignParameters
+
+    param = DesignParameters(os.path.join(PROPS, "dji_phantom3.json"))
+    p = cls(param, (param.radius - param.hub_radius) / stations)
+    p.blade_elements = []
+    for r in np.linspace(param.hub_radius, param.radius, p.radial_steps):
+        twist = 0.2 + 0.6 * (1 - r / param.radius)
+        be = p.new_foil(r, 5000, twist)
+        be.set_twist(twist)
+        be.set_chord(be.foil.chord * (0.8 + 0.2 * r / param.radius))
+        p.blade_elements.append(be)
+    p.scimitar_interpolator = None
+    return p
+
+
+@pytest.fixture
+def naca_prop():
+    from proply.prop import NACAProp
+
+    return make_prop(NACAProp)
+
+
+@pytest.fixture
+def arad_prop():
+    from proply.prop import ARADProp
+
+    return make_prop(ARADProp)
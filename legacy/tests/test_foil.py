@@ -0,0 +1,140 @@
+import numpy as np
+import pytest
+
+from proply import foil
+from proply.foil import NACA4
+
+
+def baseline_naca4(chord, t, m, p, te, n):
+    """ NACA4.get_shape_points as it was: 5n points, every fifth kept """
+    n = n * 5
+    x = (1.0 - np.cos(np.linspace(0, np.pi, n))) / 2
+    yt = (
+        5.0 * t * (0.2969 * np.sqrt(x) - 0.1260 * x - 0.3516 * x ** 2 + 0.2843 * x ** 3 - 0.1036 * x ** 4)
+        + np.linspace(0, te / 2, n)
+    )
+    if m == 0:
+        yc = np.zeros(n)
+        dyc = np.zeros(n)
+    else:
+        yc = (m / (p ** 2)) * (2.0 * p * x - x ** 2)
+        yc2 = (m / ((1.0 - p) ** 2)) * (1.0 - 2.0 * p + 2 * p * x - x ** 2)
+        yc[x > p] = yc2[x > p]
+        dyc = m * (2.0 * p - 2 * x) / p ** 2
+        dyc[x > p] = (2 * m * (p - x) / (p - 1.0) ** 2)[x > p]
+    theta = np.arctan(dyc)
+    xu, yu = x - yt * np.sin(theta), yc + yt * np.cos(theta)
+    xl, yl = x + yt * np.sin(theta), yc - yt * np.cos(theta)
+    return [[xl[::5] * chord, yl[::5] * chord], [xu[::5] * chord, yu[::5] * chord]]
+
+
+def naca_foils():
+    rng = np.random.default_rng(1)
+    foils = []
+    for k in range(20):
+        f = NACA4(
+            chord=rng.uniform(0.01, 0.05),
+            thickness=rng.uniform(0.06, 0.2),
+            m=0.0 if k % 4 == 0 else rng.uniform(0.01, 0.06),
+            p=rng.uniform(0.2, 0.6),
+        )
+        f.set_trailing_edge(rng.uniform(0, 0.001))
+        foils.append(f)
+    return foils
+
+
+def test_naca4_matches_baseline():
+    for f in naca_foils():
+        expected = baseline_naca4(f.chord, f.thickness, f.m, f.p, f.trailing_edge, 40)
+        assert np.allclose(f.get_shape_points(40), expected, rtol=0, atol=1e-12)
+
+
+def test_batch_shape_points_equal_get_shape_points():
+    foils = naca_foils()
+    lower, upper = NACA4.batch_shape_points(
+        [f.chord for f in foils],
+        [f.thickness for f in foils],
+        [f.m for f in foils],
+        [f.p for f in foils],
+        [f.trailing_edge for f in foils],
+        30,
+    )
+    assert lower.shape == upper.shape == (len(foils), 30, 2)
+    for k, f in enumerate(foils):
+        (xl, yl), (xu, yu) = f.get_shape_points(30)
+        assert np.array_equal(lower[k], np.stack([xl, yl], axis=-1))
+        assert np.array_equal(upper[k], np.stack([xu, yu], axis=-1))
+
+
+def test_section_shapes():
+    foils = naca_foils()
+    expected = np.array([f.get_shape_points(25) for f in foils])
+    assert np.array_equal(foil.section_shapes(foils, 25), expected)
+
+    mixed = foils[:3] + [foil.CSTFoil(0.02, 0.12)]
+    expected = np.array([f.get_shape_points(25) for f in mixed])
+    assert np.array_equal(foil.section_shapes(mixed, 25), expected)
+
+
+def test_surface_grid_uses_each_element(naca_prop):
+    grid = naca_prop.surface_grid(20)
+    for k, be in enumerate(naca_prop.blade_elements):
+        lower, upper = be.get_foil_points(20, naca_prop.get_scimitar_offset(be.r))
+        assert np.allclose(grid[k, 0], lower)
+        assert np.allclose(grid[k, 1], upper)
+
+
+def test_cst_hash():
+    a = foil.CSTFoil(0.02)
+    b = foil.CSTFoil(0.05)
+    assert a.hash() == b.hash()  # The chord is not part of the shape
+
+    # Coefficients that print the same to four places still differ
+    au = foil.CSTFoil.default_coefficients + 2e-5
+    assert foil.CSTFoil(0.02, au=au).hash() != a.hash()
+
+    c = foil.CSTFoil(0.02)
+    c.set_trailing_edge(0.0001)
+    assert c.hash() != a.hash()
+    assert foil.CSTFoil(0.02, n2=0.75).hash() != a.hash()
+
+
+def test_cst_metrics():
+    # Closed form area against the sampled shape
+    au = foil.CSTFoil.default_coefficients
+    m = foil.CSTFoil.metrics(au, -au)
+    lower, upper = foil.CSTFoil.batch_shape_points(1.0, au, -au, 0.0, 2001)
+    x = upper[0, :, 0]
+    y = upper[0, :, 1] - lower[0, :, 1]
+    area = np.sum((y[1:] + y[:-1]) / 2 * np.diff(x))
+    assert m["area"][0] == pytest.approx(area, rel=1e-4)
+    assert m["thickness"][0] == pytest.approx(0.12, abs=0.002)
+    assert m["camber"][0] == pytest.approx(0.0, abs=1e-12)
+
+
+# ARADFoil(1.0, t) with a 0.002 trailing edge, 6 points, from the
+# original CloughTocher interpolant
+ARAD_X = [0.0, 0.0715714119, 0.2657957797, 0.5270694543, 0.7805935327, 0.9537877098]
+ARAD_BASELINE = {
+    0.08: (
+        [-0.0049849131, -0.0126574421, 0.0061374068, 0.0147062758, 0.0086556324, 0.0010150232],
+        [-0.0049849131, 0.0547565713, 0.081689604, 0.0790352877, 0.0475598919, 0.0123896949],
+    ),
+    0.16: (
+        [-0.0073968395, -0.0351739587, -0.0411456857, -0.0331135368, -0.017323129, -0.0043315792],
+        [-0.0073968395, 0.0830193851, 0.1115673141, 0.0841845821, 0.040904639, 0.00960189],
+    ),
+}
+
+
+def test_arad_matches_baseline():
+    from proply.foil_ARA import ARADFoil
+
+    for t, (yl, yu) in ARAD_BASELINE.items():
+        f = ARADFoil(1.0, t)
+        f.set_trailing_edge(0.002)
+        (xl, yl_), (xu, yu_) = f.get_shape_points(6)
+        assert np.allclose(xl, ARAD_X, rtol=0, atol=1e-9)
+        assert np.allclose(xu, ARAD_X, rtol=0, atol=1e-9)
+        assert np.allclose(yl_, yl, rtol=0, atol=1e-9)
+        assert np.allclose(yu_, yu, rtol=0, atol=1e-9)
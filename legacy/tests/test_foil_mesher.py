@@ -0,0 +1,52 @@
+import os
+
+import pytest
+
+from proply import foil_mesher
+from proply.foil import NACA4
+from proply.foil_mesher import FoilMesher, MeshSettings
+
+
+@pytest.fixture
+def runs(monkeypatch):
+    """ Stand in for gmsh: write an empty mesh and record the run """
+    runs = []
+
+    def run_gmsh(geo_path, msh_path):
+        assert os.path.exists(geo_path)
+        runs.append(geo_path)
+        open(msh_path, "w").close()
+        return msh_path
+
+    monkeypatch.setattr(foil_mesher, "run_gmsh", run_gmsh)
+    return runs
+
+
+def test_cache_hits(tmp_path, runs):
+    mesher = FoilMesher(MeshSettings(n=40), cache_dir=str(tmp_path), workers=1)
+    foils = [NACA4(0.02, 0.12), NACA4(0.05, 0.12), NACA4(0.02, 0.15)]
+
+    first = mesher.mesh_all(foils)
+    # The chord does not change the unit chord shape, so one mesh serves both
+    assert first[0] == first[1] != first[2]
+    assert len(runs) == 2
+
+    assert mesher.mesh_all(foils) == first
+    assert FoilMesher(MeshSettings(n=40), cache_dir=str(tmp_path), workers=1).mesh(foils[2]) == first[2]
+    assert len(runs) == 2
+
+
+def test_settings_are_part_of_the_key(tmp_path, runs):
+    f = NACA4(0.02, 0.12)
+    a = FoilMesher(MeshSettings(n=40), cache_dir=str(tmp_path), workers=1).mesh(f)
+    b = FoilMesher(MeshSettings(n=40, wake_length=5.0), cache_dir=str(tmp_path), workers=1).mesh(f)
+    assert a != b
+    assert len(runs) == 2
+
+
+def test_mesh_blade_is_hub_first(tmp_path, runs, naca_prop):
+    mesher = FoilMesher(MeshSettings(n=40), cache_dir=str(tmp_path), workers=1)
+    meshes = mesher.mesh_blade(naca_prop)
+    assert len(meshes) == len(naca_prop.blade_elements)
+    hub = naca_prop.blade_elements[0].foil
+    assert meshes[0] == mesher.mesh(hub)
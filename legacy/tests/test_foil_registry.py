@@ -0,0 +1,61 @@
+import numpy as np
+
+from proply.foil_registry import FoilRegistry, parse_dat
+
+
+def selig(thickness):
+    """ A symmetric Selig file of the given thickness """
+    x = (1 - np.cos(np.linspace(0, np.pi, 21))) / 2
+    y = thickness * np.sin(np.pi * x)
+    lines = ["test foil"]
+    lines += ["{:.6f} {:.6f}".format(a, b) for a, b in zip(x[::-1], y[::-1])]
+    lines += ["{:.6f} {:.6f}".format(a, -b) for a, b in zip(x[1:], y[1:])]
+    return "\n".join(lines) + "\n"
+
+
+def test_parse_selig():
+    xl, yl, xu, yu = parse_dat(selig(0.1))
+    assert np.all(np.diff(xl) > 0) and np.all(np.diff(xu) > 0)
+    assert np.max(yu) == np.max(-yl) == 0.1
+
+
+def test_packaged_foil_is_not_shadowed(tmp_path, monkeypatch):
+    registry = FoilRegistry(str(tmp_path / "cache"))
+    packaged = registry.get("ara_d_6.dat")
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "ara_d_6.dat").write_text(selig(0.1))
+
+    other = FoilRegistry(str(tmp_path / "cache"))
+    assert np.array_equal(other.get("ara_d_6.dat")[2], packaged[2])
+    assert np.max(other.get("./ara_d_6.dat")[3]) == 0.1
+    assert np.max(other.get("ara_d_6.dat", on_disk=True)[3]) == 0.1
+
+
+def test_same_name_different_files(tmp_path):
+    for d, t in (("a", 0.1), ("b", 0.2)):
+        (tmp_path / d).mkdir()
+        (tmp_path / d / "foil.dat").write_text(selig(t))
+    registry = FoilRegistry(str(tmp_path / "cache"))
+    assert np.max(registry.get(str(tmp_path / "a" / "foil.dat"))[3]) == 0.1
+    assert np.max(registry.get(str(tmp_path / "b" / "foil.dat"))[3]) == 0.2
+
+    # A file changed on disk is parsed again
+    (tmp_path / "a" / "foil.dat").write_text(selig(0.15))
+    assert np.max(registry.get(str(tmp_path / "a" / "foil.dat"))[3]) == 0.15
+
+
+def test_disk_cache_is_mapped(tmp_path):
+    name = str(tmp_path / "foil.dat")
+    (tmp_path / "foil.dat").write_text(selig(0.1))
+    first = FoilRegistry(str(tmp_path / "cache")).get(name)
+    second = FoilRegistry(str(tmp_path / "cache")).get(name)
+    assert isinstance(second[0], np.memmap)
+    for a, b in zip(first, second):
+        assert np.array_equal(a, b)
+
+
+def test_registered_name(tmp_path):
+    (tmp_path / "foil.dat").write_text(selig(0.1))
+    registry = FoilRegistry(str(tmp_path / "cache"))
+    registry.register(str(tmp_path / "foil.dat"), name="My Foil")
+    assert np.max(registry.get("my foil")[3]) == 0.1
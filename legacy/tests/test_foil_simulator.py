@@ -0,0 +1,53 @@
+import numpy as np
+
+from proply.foil import NACA4
+from proply.foil_simulator import (
+    PanelSimulatedFoil,
+    PlateSimulatedFoil,
+    PlateTierSimulatedFoil,
+    TieredSimulatedFoil,
+)
+
+ALPHA = np.radians(np.arange(-20, 21, 1.0))
+
+
+def test_plate_model_unchanged():
+    fs = PlateSimulatedFoil(NACA4(0.02, 0.12))
+    assert np.allclose(fs.get_cd(10.0, ALPHA), 1.28 * np.sin(ALPHA))
+    assert np.allclose(fs.get_cl(10.0, ALPHA), 2 * np.pi * ALPHA)
+
+
+def test_plate_tier_drag_is_positive():
+    fs = PlateTierSimulatedFoil(NACA4(0.02, 0.12))
+    assert np.all(fs.get_cd(10.0, ALPHA) >= 0.02)
+    assert np.allclose(fs.get_cd(10.0, -ALPHA), fs.get_cd(10.0, ALPHA))
+    # Each plate model has its own metrics
+    assert PlateSimulatedFoil(NACA4(0.02, 0.12)).get_polar_metrics(10.0) is not fs.get_polar_metrics(10.0)
+
+
+def test_fallback_drag_is_positive():
+    # Below Re 30000 the cached simulators answer from the plate formula
+    fs = PanelSimulatedFoil(NACA4(0.002, 0.12))
+    assert fs.foil.Reynolds(5.0) < 30000
+    for alpha in (-0.2, 0.0, 0.2):
+        assert fs.get_cd(5.0, alpha) >= 0.02
+
+
+def test_tiers_are_built_on_first_use():
+    fs = TieredSimulatedFoil(NACA4(0.02, 0.12))
+    assert fs.simulators == [None, None, None]
+    fs.set_level(0)
+    before = TieredSimulatedFoil.calls["plate"]
+    fs.get_cl(10.0, 0.05)
+    assert TieredSimulatedFoil.calls["plate"] == before + 1
+    assert isinstance(fs.simulators[0], PlateTierSimulatedFoil)
+    assert fs.simulators[1:] == [None, None]
+
+
+def test_tiers_agree_with_themselves():
+    fs = TieredSimulatedFoil(NACA4(0.02, 0.12))
+    fs.set_level(0)
+    assert fs.agrees(0, 40.0, 0.05, 1e-9)
+    # The plate drag is several times the panel method's
+    fs.set_level(1)
+    assert not fs.agrees(0, 40.0, 0.05, 0.5)
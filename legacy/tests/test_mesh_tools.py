@@ -0,0 +1,87 @@
+import numpy as np
+
+from proply import mesh_tools
+from proply.render import read_stl
+
+
+def blade_grid(stations=5, n=9, closed_te=False):
+    """A (stations, 2, n, 3) grid of lens sections, lower then upper
+    surface from the leading edge, along a twisted span.
+    """
+    x = 0.5 * (1 - np.cos(np.linspace(0, np.pi, n)))
+    t = 0.1 * np.sin(np.pi * x) + (0.0 if closed_te else 0.01 * x)
+    grid = np.empty((stations, 2, n, 3))
+    for k, r in enumerate(np.linspace(10.0, 50.0, stations)):
+        a = 0.02 * k
+        for side, sign in enumerate((-1, 1)):
+            y = x - 0.5
+            z = sign * t
+            grid[k, side] = np.stack(
+                [np.full(n, r), y * np.cos(a) - z * np.sin(a), y * np.sin(a) + z * np.cos(a)],
+                axis=-1,
+            )
+    return grid
+
+
+def test_stl_holds_the_mesh_triangles(tmp_path):
+    grid = blade_grid()
+    mesh = mesh_tools.blade_solid(grid)
+    name = str(tmp_path / "blade.stl")
+    mesh.save(name)
+
+    triangles = read_stl(name)
+    assert triangles.shape == (len(mesh.faces), 3, 3)
+    assert np.array_equal(triangles, mesh.vertices[mesh.faces].astype(np.float32))
+    corners = np.unique(triangles.reshape(-1, 3), axis=0)
+    assert np.array_equal(corners, np.unique(grid.reshape(-1, 3).astype(np.float32), axis=0))
+
+
+def edge_counts(faces):
+    """ How many faces share each undirected edge, and whether any directed
+        edge repeats (two neighbours wound the same way)
+    """
+    directed = np.concatenate([faces[:, [0, 1]], faces[:, [1, 2]], faces[:, [2, 0]]])
+    undirected = np.sort(directed, axis=1)
+    _, counts = np.unique(undirected, axis=0, return_counts=True)
+    repeated = len(np.unique(directed, axis=0)) != len(directed)
+    return counts, repeated
+
+
+def assert_closed(mesh):
+    counts, repeated = edge_counts(mesh.faces)
+    assert np.all(counts == 2)
+    assert not repeated
+    assert mesh.is_watertight()
+    assert mesh.volume() > 0
+
+
+def test_blade_solid_is_watertight():
+    for closed_te in (False, True):
+        assert_closed(mesh_tools.blade_solid(blade_grid(closed_te=closed_te)))
+
+
+def test_blade_from_sections_is_watertight():
+    # Station k of a blade with a different number of points at each
+    sections = [blade_grid(stations=6, n=n)[k] for k, n in enumerate((9, 12, 7, 15, 9, 5))]
+    assert_closed(mesh_tools.blade_solid(sections))
+
+
+def test_prop_mesh_is_watertight(naca_prop):
+    for ccw in (False, True):
+        assert_closed(naca_prop.prop_mesh(20, ccw=ccw))
+
+    naca_prop.loft_tolerance = 1e-5
+    assert_closed(naca_prop.prop_mesh(20))
+    naca_prop.chord_tolerance = 2e-5
+    assert_closed(naca_prop.prop_mesh(20))
+
+
+def test_blade_stl_is_watertight(naca_prop, tmp_path):
+    name = str(tmp_path / "blade.stl")
+    naca_prop.gen_stl(name, 20)
+    triangles = read_stl(name)
+    # Weld the corners by their coordinates
+    _, faces = np.unique(triangles.reshape(-1, 3), axis=0, return_inverse=True)
+    counts, repeated = edge_counts(faces.reshape(-1, 3))
+    assert np.all(counts == 2)
+    assert not repeated
@@ -0,0 +1,42 @@
+import os
+
+import numpy as np
+import pytest
+
+from proply import optimize
+from proply.design_parameters import DesignParameters
+from proply.foil import NACA4
+from proply.foil_simulator import TieredSimulatedFoil
+from proply.prop import NACAProp
+
+from conftest import PROPS
+
+
+def test_fixed_alpha_bounds(monkeypatch):
+    fs = TieredSimulatedFoil(NACA4(0.02, 0.12))
+    fs.set_level(0)
+    lower, upper = optimize.alpha_bounds(fs, 5.0, 6000, 0.08, 0.0)
+    assert lower == pytest.approx(0.0, abs=1e-9)
+    assert upper == pytest.approx(np.radians(10))
+
+    monkeypatch.setattr(optimize, "polar_bounds", False)
+    assert optimize.alpha_bounds(fs, 5.0, 6000, 0.08, 0.0) == (-np.radians(8), np.radians(10))
+
+
+def design(polar_bounds, monkeypatch):
+    monkeypatch.setattr(optimize, "polar_bounds", polar_bounds)
+    param = DesignParameters(os.path.join(PROPS, "dji_phantom3.json"))
+    p = NACAProp(param, (param.radius - param.hub_radius) / 8)
+    p.n_blades = param.blades
+    return p.full_optimize(0.05, 6000, thrust=param.thrust)
+
+
+def test_polar_bounds_keep_the_reference_design(monkeypatch):
+    """ On the plate tier, bounding the twist search by the polar metrics
+        leaves the reference prop's thrust and torque as they were.
+    """
+    monkeypatch.setattr(TieredSimulatedFoil, "top_level", staticmethod(lambda: 0))
+    q0, t0 = design(False, monkeypatch)
+    q1, t1 = design(True, monkeypatch)
+    assert q1 == pytest.approx(q0, rel=0.01)
+    assert t1 == pytest.approx(t0, rel=0.01)
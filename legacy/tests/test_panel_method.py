@@ -0,0 +1,39 @@
+import numpy as np
+import pytest
+
+from proply.foil import NACA4
+from proply.foil_simulator import PanelSimulatedFoil, foil_coordinates
+from proply.panel_method import PanelSolver
+
+ALPHA = np.radians([-4.0, -2.0, 0.0, 2.0, 4.0])
+
+
+@pytest.fixture(scope="module")
+def naca0012():
+    x, y = foil_coordinates(NACA4(1.0, 0.12), 80)
+    return PanelSolver(x, y)
+
+
+def test_naca0012_lift_slope(naca0012):
+    _, cl, cm = naca0012.inviscid(ALPHA)
+    # Thin aerofoil theory gives 2 pi, thickness adds about 0.77 t to that
+    slope = np.polyfit(ALPHA, cl, 1)[0]
+    assert slope / (2 * np.pi) == pytest.approx(1 + 0.77 * 0.12, abs=0.02)
+    assert np.allclose(cl, -cl[::-1], atol=1e-9)
+    assert np.all(np.abs(cm) < 0.01)
+
+
+def test_naca0012_drag(naca0012):
+    cl, cd, cm = naca0012.polar(ALPHA, 1e6)
+    # XFOIL gives about 0.0054 at zero lift and Re 1e6
+    assert 0.004 < cd[2] < 0.007
+    assert np.allclose(cd, cd[::-1])
+    assert np.all(np.diff(cd[2:]) > 0)
+
+
+def test_panel_simulator_metrics():
+    fs = PanelSimulatedFoil(NACA4(0.1, 0.12))
+    metrics = fs.get_polar_metrics(15.0)
+    assert metrics.zero_lift_alpha == pytest.approx(0.0, abs=np.radians(0.1))
+    assert metrics.cl_max > 0.8
+    assert 0 < metrics.best_ld_alpha <= metrics.cl_max_alpha
@@ -0,0 +1,61 @@
+import numpy as np
+
+from proply import foil_simulator
+from proply.foil import NACA4
+from proply.foil_simulator import FoilPolars, PanelSimulatedFoil, PolarRegistry
+
+
+def entry():
+    return FoilPolars(None)
+
+
+def test_lru_eviction():
+    size = entry().nbytes()
+    registry = PolarRegistry(max_bytes=3 * size)
+    for key in "abc":
+        assert registry.lookup(key) is None
+        registry.insert(key, entry())
+    assert registry.lookup("a") is not None  # a is now the most recently used
+    registry.insert("d", entry())
+
+    assert list(registry.entries) == ["c", "a", "d"]
+    stats = registry.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 3
+    assert stats["evictions"] == 1
+    assert stats["bytes"] == 3 * size
+
+
+def test_resize_evicts_others():
+    size = entry().nbytes()
+    registry = PolarRegistry(max_bytes=3 * size)
+    for key in "abc":
+        registry.insert(key, entry())
+    # c grows by a loaded polar, pushing out the least recently used
+    registry.entries["c"].polars[(1e5, 0.0)] = [np.poly1d(np.zeros(10)), np.poly1d(np.zeros(10))]
+    registry.resize("c")
+    assert list(registry.entries) == ["b", "c"]
+    assert registry.evictions == 1
+    assert registry.nbytes == sum(e.nbytes() for e in registry.entries.values())
+
+
+def test_set_max_bytes():
+    size = entry().nbytes()
+    registry = PolarRegistry()
+    for key in "abcd":
+        registry.insert(key, entry())
+    registry.set_max_bytes(2 * size)
+    assert list(registry.entries) == ["c", "d"]
+    assert registry.evictions == 2
+
+
+def test_identical_sections_share_polars(monkeypatch):
+    registry = PolarRegistry()
+    monkeypatch.setattr(foil_simulator, "polar_registry", registry)
+    a = PanelSimulatedFoil(NACA4(0.02, 0.12))
+    b = PanelSimulatedFoil(NACA4(0.03, 0.12))
+    c = PanelSimulatedFoil(NACA4(0.02, 0.15))
+    assert a.polars is b.polars
+    assert a.polars is not c.polars
+    assert registry.stats()["hits"] == 1
+    assert registry.stats()["misses"] == 2
@@ -0,0 +1,64 @@
+import sqlite3
+
+import numpy as np
+import pytest
+
+from proply import polar_surrogate
+from proply.foil import NACA4
+from proply.foil_simulator import SurrogateSimulatedFoil, XfoilSimulatedFoil
+
+
+class CountingConnection:
+    """ An sqlite connection that counts the queries made through it """
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.queries = 0
+
+    def execute(self, *args):
+        self.queries += 1
+        return self.conn.execute(*args)
+
+
+def polar_db():
+    """ Thin aerofoil polars of NACA 00xx foils at a few Reynolds numbers """
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE foil(id integer PRIMARY KEY, hash varchar)")
+    conn.execute("CREATE TABLE simulation(id integer PRIMARY KEY, foil_id int, reynolds float, mach float)")
+    conn.execute("CREATE TABLE polar(sim_id int, alpha float, cl float, cd, cdp, cm, Top_Xtr, Bot_Xtr)")
+    alpha = np.radians(np.arange(-10, 10.5, 1.0))
+    sim = 0
+    for k, t in enumerate((0.08, 0.10, 0.12, 0.14)):
+        f = NACA4(1.0, t)
+        conn.execute("INSERT INTO foil VALUES (?, ?)", (k, f.hash()))
+        for reynolds in (50000, 100000, 200000):
+            sim += 1
+            conn.execute("INSERT INTO simulation VALUES (?, ?, ?, ?)", (sim, k, reynolds, 0.0))
+            cd = 0.01 + 0.5 * alpha ** 2
+            for row in zip(alpha, 2 * np.pi * alpha, cd):
+                conn.execute("INSERT INTO polar VALUES (?, ?, ?, ?, 0, 0, 0, 0)", (sim,) + tuple(row))
+    return CountingConnection(conn)
+
+
+@pytest.fixture
+def db(monkeypatch):
+    conn = polar_db()
+    monkeypatch.setattr(polar_surrogate, "g_surrogates", None)
+    monkeypatch.setattr(XfoilSimulatedFoil, "get_db", staticmethod(lambda: conn))
+    return conn
+
+
+def test_surrogates_are_loaded_once(db):
+    for t in (0.09, 0.11, 0.13):
+        for v in (10.0, 30.0):
+            fs = SurrogateSimulatedFoil(NACA4(0.05, t))
+            fs.get_polars(v)
+    assert db.queries == 1
+
+
+def test_surrogate_reproduces_training_data(db):
+    alpha = np.radians(np.arange(-8, 9, 2.0))
+    cl, cd, cm, sigma = polar_surrogate.predict_polar(db, NACA4(1.0, 0.1).hash(), 100000, 0.0, alpha)
+    assert np.allclose(cl, 2 * np.pi * alpha, atol=0.02)
+    assert np.allclose(cd, 0.01 + 0.5 * alpha ** 2, rtol=0.05)
+    assert np.max(sigma) < 0.05
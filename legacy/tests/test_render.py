@@ -0,0 +1,54 @@
+import os
+import subprocess
+import sys
+
+import numpy as np
+
+from proply import render
+from proply.stl_tools import StlWriter
+
+
+def cube():
+    """ The 12 outward-facing triangles of the unit cube """
+    v = np.array([[x, y, z] for x in (0, 1) for y in (0, 1) for z in (0, 1)], dtype=float)
+    quads = [(0, 1, 3, 2), (4, 6, 7, 5), (0, 4, 5, 1), (2, 3, 7, 6), (0, 2, 6, 4), (1, 5, 7, 3)]
+    faces = [f for a, b, c, d in quads for f in ((a, b, c), (a, c, d))]
+    return v[faces]
+
+
+def test_read_stl_round_trip(tmp_path):
+    name = str(tmp_path / "cube.stl")
+    with StlWriter(name) as w:
+        w.write(cube())
+    assert np.array_equal(render.read_stl(name), cube())
+
+
+def test_render_cube(tmp_path):
+    name = str(tmp_path / "cube.stl")
+    with StlWriter(name) as w:
+        w.write(cube())
+    image = render.Renderer(width=64, height=48, supersample=2).render(render.read_stl(name))
+
+    assert image.shape == (48, 64, 3)
+    assert np.all(image[0, 0] == 255) and np.all(image[-1, -1] == 255)
+    # Three faces are in view, each with its own flat shade
+    covered = image[np.any(image != 255, axis=2)]
+    assert len(covered) > 0.3 * 64 * 48
+    shades, counts = np.unique(covered, axis=0, return_counts=True)
+    assert np.sum(counts > 100) == 3
+
+
+def test_render_files(tmp_path):
+    name = str(tmp_path / "cube.stl")
+    png = str(tmp_path / "cube.png")
+    with StlWriter(name) as w:
+        w.write(cube())
+    render.render_files([name], [png], render.Renderer(width=32, height=24, supersample=1))
+    with open(png, "rb") as f:
+        assert f.read(8) == b"\x89PNG\r\n\x1a\n"
+
+
+def test_render_needs_no_numpy_stl():
+    code = "import sys, proply.render; assert 'stl' not in sys.modules"
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    subprocess.check_call([sys.executable, "-c", code], cwd=root)
@@ -0,0 +1,92 @@
+import io
+
+import numpy as np
+import pytest
+
+from proply.render import read_stl
+from proply.stl_tools import STL_HEADER_BYTES, STL_RECORD, StlWriter
+
+
+def triangles(n):
+    rng = np.random.default_rng(n)
+    return rng.uniform(-1, 1, (n, 3, 3)).astype(np.float32).astype(float)
+
+
+def count(data):
+    return int(np.frombuffer(data[STL_HEADER_BYTES : STL_HEADER_BYTES + 4], dtype="<u4")[0])
+
+
+def test_count_is_back_patched(tmp_path):
+    name = str(tmp_path / "t.stl")
+    t = triangles(10)
+    with StlWriter(name, chunk=4) as w:
+        w.write(t[:3])
+        w.write(t[3:])
+    data = open(name, "rb").read()
+    assert count(data) == 10
+    assert len(data) == STL_HEADER_BYTES + 4 + 50 * 10
+    assert np.array_equal(read_stl(name), t)
+
+
+def test_normals(tmp_path):
+    name = str(tmp_path / "t.stl")
+    t = np.array([[[0, 0, 0], [1, 0, 0], [0, 1, 0]], [[0, 0, 0], [1, 0, 0], [2, 0, 0]]], dtype=float)
+    with StlWriter(name) as w:
+        w.write(t)
+    records = np.fromfile(name, dtype=STL_RECORD, offset=STL_HEADER_BYTES + 4)
+    assert np.array_equal(records["normals"], [[0, 0, 1], [0, 0, 0]])
+
+
+def test_file_object():
+    f = io.BytesIO()
+    w = StlWriter(f)
+    w.write(triangles(5))
+    w.close()
+    assert count(f.getvalue()) == 5
+    assert not f.closed
+
+
+def test_mmap(tmp_path):
+    name = str(tmp_path / "t.stl")
+    t = triangles(7)
+    with StlWriter(name, n_triangles=7, use_mmap=True, chunk=3) as w:
+        w.write(t)
+    assert np.array_equal(read_stl(name), t)
+
+    with pytest.raises(ValueError):
+        with StlWriter(name, n_triangles=2, use_mmap=True) as w:
+            w.write(t)
+
+
+def test_wrong_count(tmp_path):
+    name = str(tmp_path / "t.stl")
+
+    class Unseekable(io.BytesIO):
+        def seekable(self):
+            return False
+
+    w = StlWriter(Unseekable(), n_triangles=4)
+    w.write(triangles(3))
+    with pytest.raises(ValueError):
+        w.close()
+
+    w = StlWriter(name, n_triangles=7, use_mmap=True)
+    w.write(triangles(3))
+    with pytest.raises(ValueError):
+        w.close()
+
+
+def test_abort_keeps_the_original_error(tmp_path):
+    name = str(tmp_path / "t.stl")
+    with pytest.raises(KeyError):
+        with StlWriter(name, n_triangles=7, use_mmap=True) as w:
+            w.write(triangles(3))
+            raise KeyError("body failed")
+    assert w.records is None and w.f is None
+
+    f = open(name, "wb")
+    with pytest.raises(KeyError):
+        with StlWriter(f, n_triangles=7) as w:
+            raise KeyError("body failed")
+    assert not f.closed  # The caller's file is left open
+    f.close()